@@ -0,0 +1,153 @@
+# Local stand-in for the FinViz quote pages, for tests and benchmarks without network access.
+#
+# Run from the repository root with `python -m benchmarks.finviz_server [--port 8765]` and set
+# FINVIZ_URL=http://127.0.0.1:8765/quote.ashx?t= for the app, or call start_server() from a
+# script. Saved pages in benchmarks/fixtures/finviz/<TICKER>.html are served as they are; any
+# other ticker gets a synthetic page with FinViz's quote page layout and news table, which
+# is the same on every run. Responses carry ETag and Last-Modified headers and answer
+# conditional requests with 304. Latency and a share of failing 503 responses can be added
+# to exercise the client's concurrency and retries.
+
+import argparse
+import hashlib
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'finviz')
+
+# Rows in a synthetic news table, as many as FinViz shows
+NEWS_ROWS = 100
+
+SUBJECTS = ('Shares', 'Revenue', 'Earnings', 'Guidance', 'Margins', 'Demand', 'The stock', 'Analysts', 'Sales')
+POSITIVE = ('surge on strong results', 'beat expectations', 'rally after upgrade', 'hit record high',
+            'gain as outlook improves', 'jump on great demand')
+NEGATIVE = ('fall after weak guidance', 'miss estimates', 'slump on lawsuit fears', 'drop amid recall',
+            'tumble as losses widen', 'decline on disappointing sales')
+NEUTRAL = ('in focus ahead of report', 'unchanged in early trading', 'to be reviewed next week',
+           'set for annual meeting')
+SOURCES = ('Reuters', 'Bloomberg', 'Zacks', 'Motley Fool', 'MarketWatch', 'Barrons.com')
+
+
+# Function to build a synthetic quote page for a ticker with the FinViz news table layout
+def synthetic_page(ticker, rows=NEWS_ROWS, now=None):
+    rng = random.Random(ticker)
+    now = now or datetime(2024, 3, 1, 16, 0)
+    stamp = now
+    news = []
+    previous_day = None
+    for row in range(rows):
+        stamp -= timedelta(minutes=rng.randint(10, 400))
+        tone = rng.choice((POSITIVE, NEGATIVE, NEUTRAL))
+        headline = f'{ticker} {rng.choice(SUBJECTS).lower()} {rng.choice(tone)}'
+        # FinViz prints the date only on the first row of each day
+        day = stamp.strftime('%b-%d-%y')
+        when = f'{day} {stamp:%I:%M%p}' if day != previous_day else f'{stamp:%I:%M%p}'
+        previous_day = day
+        news.append(
+            f'<tr class="cursor-pointer has-label"><td width="130" align="right">{when}</td>'
+            f'<td align="left"><div class="news-link-container"><div class="news-link-left">'
+            f'<a class="tab-link-news" href="https://example.com/{ticker}/{row}" target="_blank" '
+            f'rel="nofollow">{headline}</a></div><div class="news-link-right"><span>({rng.choice(SOURCES)})</span>'
+            f'</div></div></td></tr>')
+
+    # Everything around the news table that a full-page parse has to walk through as well
+    snapshot = ''.join(f'<tr class="table-dark-row">' + ''.join(
+        f'<td class="snapshot-td2" align="left">Field {row}.{cell}</td>'
+        f'<td class="snapshot-td2"><b>{rng.uniform(0, 500):.2f}</b></td>' for cell in range(6)) + '</tr>'
+        for row in range(13))
+    menu = ''.join(f'<li class="nav-item"><a href="/screener.ashx?v={item}" class="nav-link">Screen {item}</a></li>'
+                   for item in range(300))
+    insiders = ''.join(f'<tr class="insider-row"><td><a href="/insider.ashx?oc={row}">Insider {row}</a></td>'
+                       f'<td>Officer</td><td>{(now - timedelta(days=row)):%b %d}</td><td>Sale</td>'
+                       f'<td>{rng.uniform(10, 500):.2f}</td><td>{rng.randint(100, 99999):,}</td></tr>'
+                       for row in range(60))
+    script = '<script>var data = {' + ','.join(f'"k{item}": {rng.random():.6f}' for item in range(2000)) + '};</script>'
+    return (f'<!DOCTYPE html><html><head><title>{ticker} Stock Price and Quote</title>{script}</head><body>'
+            f'<div id="root"><ul class="nav">{menu}</ul>'
+            f'<table class="snapshot-table2" width="100%">{snapshot}</table>'
+            f'<table width="100%" cellpadding="1" cellspacing="0" border="0" id="news-table" '
+            f'class="fullview-news-outer news-table">{"".join(news)}</table>'
+            f'<table class="body-table insider-trading">{insiders}</table></div></body></html>')
+
+
+# Function to load the page served for a ticker: a saved fixture if there is one, else a synthetic page
+def fixture_page(ticker):
+    path = os.path.join(FIXTURE_DIR, f'{ticker}.html')
+    if os.path.exists(path):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return f.read()
+    return synthetic_page(ticker)
+
+
+# Function to build a request handler class with the given latency and failure rate
+def make_handler(latency=0., fail_rate=0.):
+    pages = {}
+    started = formatdate(time.time(), usegmt=True)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            query = parse_qs(urlsplit(self.path).query)
+            ticker = query.get('t', [''])[0].upper()
+            if latency:
+                time.sleep(latency)
+            if not ticker:
+                self._reply(404, b'')
+                return
+            if fail_rate and random.random() < fail_rate:
+                self._reply(503, b'', {'Retry-After': '0'})
+                return
+            with lock:
+                if ticker not in pages:
+                    body = fixture_page(ticker).encode('utf-8')
+                    pages[ticker] = (body, '"' + hashlib.sha1(body).hexdigest() + '"')
+            body, etag = pages[ticker]
+            if self.headers.get('If-None-Match') == etag:
+                self._reply(304, b'', {'ETag': etag, 'Last-Modified': started})
+                return
+            self._reply(200, body, {'ETag': etag, 'Last-Modified': started, 'Content-Type': 'text/html; charset=utf-8'})
+
+        def _reply(self, status, body, headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+# Function to start the server on a background thread, returning it and the FINVIZ_URL to use
+def start_server(host='127.0.0.1', port=0, latency=0., fail_rate=0.):
+    server = ThreadingHTTPServer((host, port), make_handler(latency, fail_rate))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}/quote.ashx?t='
+
+
+# Function to run the server in the foreground
+def main():
+    parser = argparse.ArgumentParser(description='Serve saved or synthetic FinViz quote pages.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0., help='seconds to wait before every response')
+    parser.add_argument('--fail-rate', type=float, default=0., help='share of requests answered with 503')
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.latency, args.fail_rate))
+    print(f'FINVIZ_URL=http://127.0.0.1:{args.port}/quote.ashx?t=', flush=True)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Benchmark of the targeted HTML parsing against full BeautifulSoup html.parser parses.
+#
+# Run from the repository root with `python -m benchmarks.html_parse`. The results are first
+# checked on the pages in benchmarks/fixtures: FinViz quote pages in finviz/*.html and
+# AlphaSpread pages in alphaspread/<page>-*.html, with <page> one of summary, estimates or dcf.
+# They have the malformed markup the targeted parsing has to get right, and saved copies of
+# real pages can be added next to them. The news rows and selector texts must be the same as
+# those of a full html.parser parse. Times are per page, on pages of about a real page's size:
+# the stand-in server's synthetic FinViz pages, and the AlphaSpread pages with navigation,
+# scripts and a footer added around them.
+
+import datetime
+import glob
+import os
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.finviz_server import FIXTURE_DIR, synthetic_page
+from utils.html_parse import ALPHASPREAD_SELECTORS, alphaspread_texts, news_table_rows, parse_news_page
+
+ALPHASPREAD_DIR = os.path.join(os.path.dirname(FIXTURE_DIR), 'alphaspread')
+
+SYNTHETIC_TICKERS = ('AAPL', 'MSFT', 'NVDA', 'AMZN', 'META')
+REPEATS = 5
+
+
+# Function to parse a quote page the way the Sentiment page did: a full html.parser parse and a row loop
+def parse_news_full(html):
+    news_table = BeautifulSoup(html, 'html.parser').find(id='news-table')
+    parsed_news = []
+    for x in news_table.find_all('tr'):
+        try:
+            text = x.a.get_text()
+            date_scrape = x.td.text.split()
+            if len(date_scrape) == 1:
+                time_text = date_scrape[0]
+            else:
+                date = date_scrape[0]
+                time_text = date_scrape[1]
+            parsed_news.append([datetime.datetime.strptime(f"{date}-{time_text}", "%b-%d-%y-%I:%M%p"), text])
+        except Exception:
+            pass
+    return parsed_news
+
+
+# Function to read the (date/time text, headline) of the news rows from a full html.parser parse
+def news_rows_full(html):
+    news_table = BeautifulSoup(html, 'html.parser').find(id='news-table')
+    return [(x.td.text, x.a.get_text()) for x in news_table.find_all('tr') if x.td and x.a]
+
+
+# Function to read the selectors of a page the way the Internet analysis page did
+def select_full(html, page):
+    soup = BeautifulSoup(html, 'html.parser')
+    return {name: soup.select_one(selector).get_text() for name, selector in ALPHASPREAD_SELECTORS[page][1].items()}
+
+
+# Function to read the pages in a fixture directory that match a file name pattern
+def read_fixtures(directory, pattern):
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(directory, pattern))):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+# Function to add navigation, scripts and a footer of about a real page's size around a page
+def padded_page(html):
+    navigation = ''.join(f'<li class="item"><a href="/security/nasdaq/T{item}/summary">Company {item}</a></li>'
+                         for item in range(1500))
+    script = '<script>window.__DATA__ = {' + ','.join(f'"k{item}": {item * 0.37:.3f}' for item in range(8000)) + '};</script>'
+    footer = ''.join(f'<div class="ui segment"><p>Section {item} text about valuation.</p></div>' for item in range(1500))
+    html = html.replace('</head>', f'{script}</head>', 1).replace('<body>', f'<body><nav><ul>{navigation}</ul></nav>', 1)
+    return html.replace('</body>', f'<footer>{footer}</footer></body>', 1)
+
+
+# Function to time the best of several runs of a function over all pages, per page
+def per_page(function, pages, repeats=REPEATS):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for page in pages:
+            function(page)
+        times.append(time.perf_counter() - started)
+    return min(times) / len(pages)
+
+
+# Function to run the benchmark: check the results on the fixtures, then print one row of times per page kind
+def main():
+    finviz = read_fixtures(FIXTURE_DIR, '*.html')
+    alphaspread = {page: read_fixtures(ALPHASPREAD_DIR, f'{page}-*.html') for page in ALPHASPREAD_SELECTORS}
+    print(f'{len(finviz)} FinViz and {sum(map(len, alphaspread.values()))} AlphaSpread fixture pages')
+
+    synthetic = [synthetic_page(ticker) for ticker in SYNTHETIC_TICKERS]
+    for name, html in list(finviz.items()) + list(zip(SYNTHETIC_TICKERS, synthetic)):
+        assert news_table_rows(html) == news_rows_full(html), f'news rows differ on {name}'
+    for html in synthetic:
+        assert parse_news_page(html).values.tolist() == parse_news_full(html)
+    old = per_page(parse_news_full, synthetic)
+    new = per_page(parse_news_page, synthetic)
+    print(f'{"FinViz news table:":22} html.parser {old * 1000:7.2f} ms, targeted {new * 1000:6.2f} ms ({old / new:.1f}x)')
+
+    for page, fixtures in alphaspread.items():
+        pages = [padded_page(html) for html in fixtures.values()]
+        for name, html in list(fixtures.items()) + list(zip(fixtures, pages)):
+            assert alphaspread_texts(html, page) == select_full(html, page), f'selector texts differ on {name}'
+        if not pages:
+            continue
+        old = per_page(lambda html: select_full(html, page), pages)
+        new = per_page(lambda html: alphaspread_texts(html, page), pages)
+        print(f'{f"AlphaSpread {page}:":22} html.parser {old * 1000:7.2f} ms, targeted {new * 1000:6.2f} ms '
+              f'({old / new:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
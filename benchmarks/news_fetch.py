@@ -0,0 +1,68 @@
+# Benchmark of the concurrent FinViz fetcher against one blocking urlopen per ticker.
+#
+# Run from the repository root with `python -m benchmarks.news_fetch`. Pages come from the
+# local stand-in server with a fixed latency per response, so no network access is needed.
+# The page cache goes to a temporary directory and is removed afterwards.
+
+import shutil
+import tempfile
+import time
+from urllib.request import Request, urlopen
+
+import utils.news_fetch as news_fetch
+from benchmarks.finviz_server import start_server
+
+WATCHLIST = [f'T{number:03d}' for number in range(100)]
+LATENCY = 0.3
+FAIL_RATE = 0.1
+
+
+# Function to fetch every page one after another like the Sentiment page did
+def fetch_sequential(base_url, tickers):
+    pages = {}
+    for ticker in tickers:
+        request = Request(url=base_url + ticker, headers={'User-Agent': 'Mozilla/5.0'})
+        pages[ticker] = urlopen(request).read()
+    return pages
+
+
+# Function to run the benchmark and print one line per fetch strategy
+def main():
+    server, base_url = start_server(latency=LATENCY)
+    flaky_server, flaky_url = start_server(latency=LATENCY, fail_rate=FAIL_RATE)
+    news_fetch.CACHE_DIR = tempfile.mkdtemp()
+    try:
+        print(f'{len(WATCHLIST)} tickers, {LATENCY * 1000:.0f} ms per response')
+
+        started = time.perf_counter()
+        fetch_sequential(base_url, WATCHLIST)
+        sequential = time.perf_counter() - started
+        print(f'sequential urlopen:          {sequential:6.2f} s')
+
+        # Unthrottled to measure the client itself, then with the default politeness limits
+        for label, rate in (('async, no rate limit', 0), ('async, default limits', news_fetch.REQUESTS_PER_SECOND)):
+            shutil.rmtree(news_fetch.CACHE_DIR, ignore_errors=True)
+            started = time.perf_counter()
+            pages, failures = news_fetch.fetch_news_pages(WATCHLIST, base_url, requests_per_second=rate)
+            elapsed = time.perf_counter() - started
+            print(f'{label + ":":28} {elapsed:6.2f} s ({sequential / elapsed:.1f}x), {len(pages)} pages, '
+                  f'{len(failures)} failures')
+
+        # Every page is cached now, so each request is answered with 304 Not Modified
+        started = time.perf_counter()
+        pages, failures = news_fetch.fetch_news_pages(WATCHLIST, base_url, requests_per_second=0)
+        print(f'{"async, conditional rerun:":28} {time.perf_counter() - started:6.2f} s, {len(pages)} pages')
+
+        shutil.rmtree(news_fetch.CACHE_DIR, ignore_errors=True)
+        started = time.perf_counter()
+        pages, failures = news_fetch.fetch_news_pages(WATCHLIST, flaky_url, requests_per_second=0)
+        print(f'{f"async, {FAIL_RATE:.0%} 503 responses:":28} {time.perf_counter() - started:6.2f} s, '
+              f'{len(pages)} pages, {len(failures)} failures')
+    finally:
+        server.shutdown()
+        flaky_server.shutdown()
+        shutil.rmtree(news_fetch.CACHE_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# Benchmark of batch VADER scoring against the DataFrame.apply path it replaced.
+#
+# Run from the repository root with `python -m benchmarks.sentiment_scoring`. Needs the
+# nltk vader_lexicon. Headlines are built from the stand-in server's vocabulary, so no
+# network access is needed; most are distinct, like a back-filled corpus. Throughput is in
+# headlines per second, and the pool run includes starting its workers. The pool path is
+# forced even on a single CPU, where it can only show its overhead.
+
+import os
+import random
+import time
+
+import numpy as np
+import pandas as pd
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+import utils.sentiment_batch as sentiment_batch
+from benchmarks.finviz_server import NEGATIVE, NEUTRAL, POSITIVE, SUBJECTS
+from utils.process_pool import shutdown_pool
+from utils.sentiment_batch import SCORE_COLUMNS, score_headlines
+
+SIZES = (1000, 20000, 100000)
+
+
+# Function to build a corpus of headlines that are nearly all distinct
+def make_headlines(count, seed=0):
+    rng = random.Random(seed)
+    tickers = [f'T{number:03d}' for number in range(500)]
+    return [f'{rng.choice(tickers)} {rng.choice(SUBJECTS).lower()} {rng.choice(POSITIVE + NEGATIVE + NEUTRAL)}, '
+            f'{rng.uniform(-9.5, 9.5):+.2f}% on {rng.randint(1, 28)} {rng.choice(("Jan", "Apr", "Jul", "Oct"))}'
+            for _ in range(count)]
+
+
+# Function to score headlines the way score_news did: one analyzer and DataFrame.apply
+def score_apply(headlines):
+    vader = SentimentIntensityAnalyzer()
+    news = pd.DataFrame({'Headline': headlines})
+    scores = news['Headline'].apply(vader.polarity_scores).tolist()
+    return news.join(pd.DataFrame(scores, index=news.index))
+
+
+# Function to time one run of a function
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started, result
+
+
+# Function to run the benchmark and print one row per corpus size
+def main():
+    workers = os.cpu_count() or 1
+    print(f'{workers} CPUs')
+    print(f'{"headlines":>10} {"apply":>12} {"batch, in process":>18} {f"batch, pool of {workers}":>20}')
+    for size in SIZES:
+        headlines = make_headlines(size)
+        apply_time, expected = timed(lambda: score_apply(headlines))
+        single_time, single = timed(lambda: score_headlines(headlines, max_workers=1))
+        # Batches below MIN_PARALLEL headlines stay in process here as well
+        pool_time, pooled = timed(lambda: score_headlines(headlines, max_workers=max(workers, 2)))
+        # Shut the pool down so the next size counts its start-up again
+        shutdown_pool(sentiment_batch.POOL_NAME)
+        for column in SCORE_COLUMNS:
+            assert np.allclose(single[column], expected[column]) and np.allclose(pooled[column], expected[column])
+        print(f'{size:>10} {size / apply_time:>10.0f}/s {size / single_time:>16.0f}/s {size / pool_time:>18.0f}/s')
+
+
+if __name__ == '__main__':
+    main()
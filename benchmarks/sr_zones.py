@@ -0,0 +1,94 @@
+# Benchmark of the SR zone engine against the scikit-learn KMeans path it replaced.
+#
+# Run from the repository root with `python -m benchmarks.sr_zones`. The KMeans side needs
+# scikit-learn, which the app itself no longer depends on. Closes are synthetic random
+# walks quoted in cents like real prices, so no network access is needed. Single fits are
+# timed on their own; the gain over KMeans shows in the import, rerun and watchlist rows.
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.sr_zones import optimal_centers, optimal_centers_many, update_zone_state, zone_centers, zone_state
+
+SIZES = (250, 2520, 20000)
+WATCHLIST = 300
+NUM_CLUSTERS = 5
+BIN_PCT = 0.5
+REPEATS = 5
+
+
+# Function to time the best of several runs of a function
+def best_time(function, repeats=REPEATS):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+# Function to compute the within-cluster sum of squares of closes around the given centres
+def inertia(closes, centers):
+    return ((closes[:, None] - centers[None]) ** 2).min(axis=1).sum()
+
+
+# Function to run the benchmark and print one row per series length
+def main():
+    started = time.perf_counter()
+    from sklearn.cluster import KMeans
+    print(f'sklearn import: {time.perf_counter() - started:.3f} s')
+
+    rng = np.random.default_rng(42)
+    print(f"{'bars':>6} {'kmeans s':>10} {'optimal s':>10} {'binned s':>10} {'append s':>10} {'rerun s':>10} "
+          f"{'kmeans SS':>12} {'optimal SS':>12} {'binned SS':>12}")
+    for size in SIZES:
+        # Daily-sized moves for the shorter series, intraday-sized moves for the longest
+        volatility = 0.015 if size <= 2520 else 0.002
+        closes = np.round(100 * np.exp(np.cumsum(rng.normal(0, volatility, size))), 2)
+        dates = pd.bdate_range('2000-01-03', periods=size)
+
+        def kmeans():
+            return np.sort(KMeans(n_clusters=NUM_CLUSTERS, random_state=42).fit(closes.reshape(-1, 1))
+                           .cluster_centers_.ravel())
+
+        def optimal():
+            return optimal_centers(np.sort(closes), NUM_CLUSTERS)
+
+        def binned():
+            return optimal_centers(np.sort(closes), NUM_CLUSTERS, BIN_PCT)
+
+        # One new bar on top of a state built from the rest of the series
+        state = zone_state(closes[:-1], dates[:-1])
+
+        def append():
+            return zone_centers(update_zone_state(state, closes, dates), NUM_CLUSTERS, BIN_PCT)
+
+        # A rerun on unchanged bars, e.g. after moving an unrelated slider
+        current = update_zone_state(state, closes, dates)
+        zone_centers(current, NUM_CLUSTERS, BIN_PCT)
+
+        def rerun():
+            return zone_centers(update_zone_state(current, closes, dates), NUM_CLUSTERS, BIN_PCT)
+
+        kmeans_time = best_time(kmeans)
+        optimal_time = best_time(optimal)
+        binned_time = best_time(binned)
+        append_time = best_time(append)
+        rerun_time = best_time(rerun)
+        print(f'{size:>6} {kmeans_time:>10.4f} {optimal_time:>10.4f} {binned_time:>10.4f} {append_time:>10.4f} '
+              f'{rerun_time:>10.6f} {inertia(closes, kmeans()):>12.1f} {inertia(closes, optimal()):>12.1f} '
+              f'{inertia(closes, binned()):>12.1f}')
+
+    # Zones for a whole watchlist of 10-year daily series, one KMeans fit per ticker against one batched solve
+    panel = np.sort(np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.015, (2520, WATCHLIST)), axis=0)), 2), axis=0)
+    kmeans_time = best_time(lambda: [KMeans(n_clusters=NUM_CLUSTERS, random_state=42).fit(column.reshape(-1, 1))
+                                     for column in panel.T], repeats=1)
+    batched_time = best_time(lambda: optimal_centers_many(list(panel.T), NUM_CLUSTERS, BIN_PCT), repeats=1)
+    print(f'{WATCHLIST} tickers: kmeans {kmeans_time:.3f} s, batched binned {batched_time:.3f} s '
+          f'({kmeans_time / batched_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,17 @@
 import streamlit as st
 import numpy as np
 import pandas as pd
-import yfinance as yf
-import statsmodels.api as sm
-from filterpy.kalman import KalmanFilter
-from math import sqrt
 import plotly.graph_objects as go
 import warnings
 import time
+from utils.backtest import backtest_pairs, pair_result, sweep_pairs
+from utils.cointegration import coint_pairs, pair_indices
+from utils.decimate import decimate_figure
+from utils.incremental import incremental_coint, state_key
+from utils.parallel_scan import scan_pairs_parallel
+from utils.prefilter import candidate_pairs
+from utils.price_cache import get_price_panel
+from utils.universe import scan_universe
 
 # Set display options and ignore warnings
 pd.set_option('display.max_columns', None)
@@ -42,197 +46,179 @@ Symbols_utility = ["AES", "AEP", "ATO", "AWK", "CMS", "CNP", "CEG", "D", "DUK",
 
 # Function to fetch historical stock prices
 def get_symbols(symbols, ohlc, begin_date=None, end_date=None):
-    out = []
-    new_symbols = []
+    # One batched download for whatever is not in the local price cache yet
+    data, failures = get_price_panel(symbols, ohlc, begin_date, end_date)
     for symbol in symbols:
-        try:
-            df = yf.download(symbol, start=begin_date, end=end_date)[ohlc]
-            new_symbols.append(symbol)
-            out.append(df.astype('float'))
-        except KeyError:
+        if symbol in failures:
+            st.error(f"An error occurred while fetching data for symbol {symbol}: {failures[symbol]}")
+        elif symbol not in data.columns or data[symbol].isna().all():
             st.warning(f"No data available for symbol: {symbol}. Skipping...")
-        except Exception as e:
-            st.error(f"An error occurred while fetching data for symbol {symbol}: {e}")
-    if not out:
+    data = data.dropna(axis=1, how='all')
+    if data.empty:
         st.error("No data available for any symbol. Please adjust the date range.")
         return None
-    data = pd.concat(out, axis=1)
-    data.columns = new_symbols
-    data = data.dropna(axis=1)
     return data.dropna(axis=1)
 
 
+# Function to collect the pairs below the cointegration threshold as column indices into the price panel
+def collect_pairs(left, right, pvalues, correlations, cointegration_threshold):
+    mask = pvalues < cointegration_threshold
+    return pd.DataFrame({'Index1': left[mask].astype(np.int32),
+                         'Index2': right[mask].astype(np.int32),
+                         'P-Value': pvalues[mask],
+                         'Correlation': correlations[mask]})
+
+
+# Function to rank the collected pairs by correlation and look up their symbols
+def rank_pairs(pairs, keys, top_n):
+    top_pairs = pairs.nlargest(top_n, 'Correlation')
+    top_pairs.insert(0, 'Stock1', keys[top_pairs['Index1']])
+    top_pairs.insert(1, 'Stock2', keys[top_pairs['Index2']])
+    return top_pairs
+
+
+# Function to materialise the price series of a pair only when it is backtested or plotted
+def pair_prices(dataframe, pair):
+    return dataframe.iloc[:, pair['Index1']], dataframe.iloc[:, pair['Index2']]
+
+
+# Function to report how much of the pair search the pre-filter pruned
+def show_pruning(stats):
+    st.caption(f"Pre-filter kept {stats['candidate_pairs']} of {stats['total_pairs']} pairs "
+               f"({stats['pruned_fraction']:.0%} pruned) in {stats['seconds'] * 1000:.0f} ms")
+
+
 # Function to find cointegrated pairs
-def find_cointegrated_pairs(dataframe, cointegration_threshold=0.05, top_n=10):
+def find_cointegrated_pairs(dataframe, cointegration_threshold=0.05, top_n=10, min_correlation=None,
+                            n_clusters=None):
+    n = dataframe.shape[1]
+    pvalue_matrix = np.ones((n, n))
+    correlation_matrix = np.zeros((n, n))
+
+    # Optionally prune the pairs by correlation and cluster before the expensive tests
+    if min_correlation is None and n_clusters is None:
+        left, right = pair_indices(n)
+    else:
+        left, right, _, stats = candidate_pairs(dataframe.values, min_correlation, n_clusters)
+        show_pruning(stats)
+
+    # Run the Engle-Granger test for all pairs at once on the whole price panel
+    _, pvalues, correlations = coint_pairs(dataframe.values, left, right)
+    pvalue_matrix[left, right] = pvalues
+    correlation_matrix[left, right] = correlations
+
+    pairs = collect_pairs(left, right, pvalues, correlations, cointegration_threshold)
+    top_pairs = rank_pairs(pairs, dataframe.columns, top_n)
+
+    return pvalue_matrix, correlation_matrix, top_pairs
+
+
+# Function to find cointegrated pairs, reusing saved results when only new rows were appended
+def find_cointegrated_pairs_incremental(dataframe, begin_date, cointegration_threshold=0.05, top_n=10):
+    n = dataframe.shape[1]
+    pvalue_matrix = np.ones((n, n))
+    correlation_matrix = np.zeros((n, n))
+
+    left, right = pair_indices(n)
+    key = state_key(dataframe.columns, 'Adj Close', begin_date)
+    pvalues, correlations, new_rows = incremental_coint(dataframe.values, dataframe.index, key)
+    pvalue_matrix[left, right] = pvalues
+    correlation_matrix[left, right] = correlations
+    st.caption(f'Updated with {new_rows} new rows' if new_rows < len(dataframe) else 'Full scan')
+
+    pairs = collect_pairs(left, right, pvalues, correlations, cointegration_threshold)
+    top_pairs = rank_pairs(pairs, dataframe.columns, top_n)
+
+    return pvalue_matrix, correlation_matrix, top_pairs
+
+
+# Function to find cointegrated pairs with a process pool, showing progress while the scan runs
+def find_cointegrated_pairs_parallel(dataframe, cointegration_threshold=0.05, top_n=10, min_correlation=None,
+                                     n_clusters=None, max_workers=None):
     n = dataframe.shape[1]
     pvalue_matrix = np.ones((n, n))
     correlation_matrix = np.zeros((n, n))
-    keys = dataframe.columns
-    pairs = []
-
-    for i in range(n):
-        for j in range(i + 1, n):
-            stock1 = dataframe[keys[i]]
-            stock2 = dataframe[keys[j]]
-            result = sm.tsa.stattools.coint(stock1, stock2)
-            pvalue = result[1]
-            pvalue_matrix[i, j] = pvalue
-            correlation = stock1.corr(stock2)
-            correlation_matrix[i, j] = correlation
-            if pvalue < cointegration_threshold:
-                pairs.append(
-                    (keys[i], keys[j], pvalue, correlation, stock1, stock2))
-
-    results_df = pd.DataFrame(pairs,
-                              columns=['Stock1', 'Stock2', 'P-Value', 'Correlation', 'Stock1_Price', 'Stock2_Price'])
-
-    top_pairs = results_df.nlargest(top_n, 'Correlation')
+
+    if min_correlation is None and n_clusters is None:
+        candidates = pair_indices(n)
+    else:
+        *candidates, _, stats = candidate_pairs(dataframe.values, min_correlation, n_clusters)
+        show_pruning(stats)
+    n_pairs = len(candidates[0])
+    scanned = 0
+    found = []
+
+    progress_bar = st.progress(0.0, text='Scanning pairs...')
+    preview = st.empty()
+    for left, right, pvalues, correlations in scan_pairs_parallel(dataframe.values, *candidates,
+                                                                  max_workers=max_workers):
+        pvalue_matrix[left, right] = pvalues
+        correlation_matrix[left, right] = correlations
+        found.append(collect_pairs(left, right, pvalues, correlations, cointegration_threshold))
+        scanned += len(left)
+        progress_bar.progress(scanned / n_pairs, text=f'Scanned {scanned} of {n_pairs} pairs')
+
+        # Show the best pairs found so far while the remaining chunks are still running
+        preview_df = rank_pairs(pd.concat(found), dataframe.columns, top_n)
+        if not preview_df.empty:
+            preview.dataframe(preview_df[['Stock1', 'Stock2', 'P-Value', 'Correlation']], hide_index=True)
+    progress_bar.empty()
+    preview.empty()
+
+    # Restore the nested-loop order so ties are ranked the same as the sequential scan
+    pairs = pd.concat(found or [collect_pairs(*candidates, np.ones(0), np.zeros(0), 0)])
+    pairs = pairs.sort_values(['Index1', 'Index2']).reset_index(drop=True)
+    top_pairs = rank_pairs(pairs, dataframe.columns, top_n)
 
     return pvalue_matrix, correlation_matrix, top_pairs
 
 
-# Function to calculate half-life of mean reversion
-def half_life(spread):
-    spread_lag = spread.shift(1)
-    spread_lag.iloc[0] = spread_lag.iloc[1]
-    spread_ret = spread - spread_lag
-    spread_ret.iloc[0] = spread_ret.iloc[1]
-    spread_lag2 = sm.add_constant(spread_lag)
-    model = sm.OLS(spread_ret, spread_lag2)
-    res = model.fit()
-    halflife = int(round(-np.log(2) / res.params[1], 0))
-    if halflife <= 0:
-        halflife = 1
-    return halflife
-
-
-# Function to backtest the strategy for a pair
-def backtest_pair(stock1_price_data, stock2_price_data):
-    x = stock1_price_data
-    y = stock2_price_data
-
-    df1 = pd.DataFrame({'y': y, 'x': x})
-    df1.index = pd.to_datetime(df1.index)
-    state_means = KalmanFilterRegression(KalmanFilterAverage(x), KalmanFilterAverage(y))
-    df1['hr'] = - state_means[:, 0]
-    df1['spread'] = df1.y + (df1.x * df1.hr)
-
-    halflife = half_life(df1['spread'])
-
-    meanSpread = df1.spread.rolling(window=halflife).mean()
-    stdSpread = df1.spread.rolling(window=halflife).std()
-    df1['zScore'] = (df1.spread - meanSpread) / stdSpread
-
-    entryZscore = 1.5
-    exitZscore = -0.05
-
-    df1['long entry'] = ((df1.zScore < -entryZscore) & (df1.zScore.shift(1) > -entryZscore))
-    df1['long exit'] = ((df1.zScore > -exitZscore) & (df1.zScore.shift(1) < -exitZscore))
-    df1['num units long'] = np.nan
-    df1.loc[df1['long entry'], 'num units long'] = 1
-    df1.loc[df1['long exit'], 'num units long'] = 0
-    df1['num units long'][0] = 0
-    df1['num units long'] = df1['num units long'].fillna(method='pad')
-
-    df1['short entry'] = ((df1.zScore > entryZscore) & (df1.zScore.shift(1) < entryZscore))
-    df1['short exit'] = ((df1.zScore < exitZscore) & (df1.zScore.shift(1) > exitZscore))
-    df1.loc[df1['short entry'], 'num units short'] = -1
-    df1.loc[df1['short exit'], 'num units short'] = 0
-    df1['num units short'][0] = 0
-    df1['num units short'] = df1['num units short'].fillna(method='pad')
-
-    df1['numUnits'] = df1['num units long'] + df1['num units short']
-    df1['spread pct ch'] = (df1['spread'] - df1['spread'].shift(1)) / ((df1['x'] * abs(df1['hr'])) + df1['y'])
-    df1['port rets'] = df1['spread pct ch'] * df1['numUnits'].shift(1)
-    df1['cum rets'] = df1['port rets'].cumsum()
-    df1['cum rets'] = df1['cum rets'] + 1
-
-    try:
-        sharpe = ((df1['port rets'].mean() / df1['port rets'].std()) * sqrt(252))
-    except ZeroDivisionError:
-        sharpe = 0.0
-
-    start_val = 1
-    end_val = df1['cum rets'].iat[-1]
-    start_date = df1.index[0]
-    end_date = df1.index[-1]
-    days = (end_date - start_date).days
-    CAGR = (end_val / start_val) ** (252.0 / days) - 1
-
-    num_trades_long = 0
-    num_trades_short = 0
-
-    for i in range(1, len(df1)):
-        if df1['long entry'].iloc[i] and not df1['long entry'].iloc[i - 1]:
-            num_trades_long += 1
-        elif df1['short entry'].iloc[i] and not df1['short entry'].iloc[i - 1]:
-            num_trades_short += 1
-
-    total_trades = num_trades_long + num_trades_short
-
-    # Calculate average hedge ratio for display purposes
-    average_hedge_ratio = df1['hr'].mean()
-
-    return {
-        'cum_rets': df1['cum rets'],
-        'sharpe': sharpe,
-        'CAGR': CAGR,
-        'num_trades': total_trades,
-        'halflife': halflife,
-        'entryZscore': entryZscore,
-        'exitZscore': exitZscore,
-        'average_hedge_ratio': average_hedge_ratio,  # Include hedge ratio in the return
-    }
-
-
-# Kalman filter average
-def KalmanFilterAverage(x):
-    kf = KalmanFilter(dim_x=1, dim_z=1)
-    kf.x = np.array([0.])
-    kf.F = np.array([[1.]])
-    kf.H = np.array([[1.]])
-    kf.P *= 1000.
-    kf.R = 5
-    kf.Q = np.array([[0.1]])
-
-    means = []
-    for measurement in x:
-        kf.predict()
-        kf.update(np.array([measurement]))
-        means.append(kf.x[0])
-    return np.array(means)
-
-
-# Kalman filter regression
-def KalmanFilterRegression(x, y):
-    delta = 1e-3
-    kf = KalmanFilter(dim_x=2, dim_z=1)
-    kf.x = np.array([0., 0.])
-    kf.F = np.eye(2)
-    kf.H = np.array([[0., 1.]])
-    kf.P *= 1000.
-    kf.R = 5
-    kf.Q = np.array([[delta, 0], [0, delta]])
-
-    means = []
-    for i in range(len(x)):
-        kf.H = np.array([[x[i], 1.]])
-        kf.predict()
-        kf.update(np.array([y[i]]))
-        means.append(kf.x.copy())
-    return np.array(means)
+# Function to find the top cointegrated pairs of a large universe tile by tile within a memory budget.
+# Only the running top-N is kept, so no full p-value or correlation matrix is returned.
+def find_cointegrated_pairs_universe(dataframe, cointegration_threshold=0.05, top_n=10, memory_budget=256 * 2 ** 20):
+    progress_bar = st.progress(0.0, text='Scanning tiles...')
+    for done, n_tiles, heap in scan_universe(dataframe.values, dataframe.columns, cointegration_threshold, top_n,
+                                             memory_budget):
+        progress_bar.progress(done / n_tiles, text=f'Scanned {done} of {n_tiles} tiles')
+    progress_bar.empty()
+
+    top = sorted(heap, reverse=True)
+    pairs = pd.DataFrame({'Index1': np.array([item[2] for item in top], dtype=np.int32),
+                          'Index2': np.array([item[3] for item in top], dtype=np.int32),
+                          'P-Value': np.array([item[4] for item in top], dtype=float),
+                          'Correlation': np.array([item[0] for item in top], dtype=float)})
+    top_pairs = rank_pairs(pairs, dataframe.columns, top_n)
+
+    return None, None, top_pairs
 
 
 # Streamlit application setup
 st.title('Pairs Trading Strategy Backtester')
 
 # Main page parameter settings with dropdown menu
-sector_options = ['Energy', 'Financial', 'Healthcare', 'Utility']
+sector_options = ['Energy', 'Financial', 'Healthcare', 'Utility', 'All sectors']
 sector = st.selectbox('Select Sector', options=sector_options)
 cointegration_threshold = st.slider('Cointegration Threshold', 0.01, 0.5, 0.05, 0.01)
 top_n_pairs = st.slider('Top N Pairs', 5, 50, 10, 5)
 start_date = st.date_input('Start Date', value=pd.to_datetime('2023-01-01'))
 end_date = st.date_input('End Date', value=pd.to_datetime('2023-12-31'))
+parallel_scan = st.checkbox('Parallel scan', value=False,
+                            help='Split the pair scan across a process pool and show pairs as they are found.')
+incremental_update = st.checkbox('Incremental update', value=False,
+                                 help='Reuse the previous scan when only the end date moved forward. '
+                                      'All pairs are tested, so the pre-filter is not applied.')
+universe_scan = st.checkbox('Tiled universe scan', value=False,
+                            help='Scan the pair matrix in tiles within a memory budget, keeping only the top pairs. '
+                                 'An interrupted scan resumes from its last finished tile.')
+if universe_scan:
+    memory_budget = st.slider('Memory budget (MB)', 32, 2048, 256, 32) * 2 ** 20
+with st.expander('Pair pre-filter', expanded=False):
+    min_correlation = st.slider('Minimum correlation (0 = off)', 0.0, 0.99, 0.0, 0.01)
+    n_clusters = st.slider('Number of correlation clusters (0 = off)', 0, 50, 0)
+min_correlation = min_correlation or None
+n_clusters = n_clusters or None
+parameter_sweep = st.checkbox('Parameter sweep', value=False,
+                              help='Backtest the top pairs over a grid of entry/exit z-scores and look-back windows.')
 
 # Mapping sector selection to corresponding symbols
 if sector == 'Healthcare':
@@ -241,36 +227,58 @@ elif sector == 'Energy':
     symbols = Symbols_energy
 elif sector == 'Utility':
     symbols = Symbols_utility
+elif sector == 'All sectors':
+    symbols = list(dict.fromkeys(Symbols_energy + Symbols_financial + Symbols_healthcare + Symbols_utility))
 else:  # Default to Financial if none of the above
     symbols = Symbols_financial
 
 df = get_symbols(symbols, 'Adj Close', begin_date=start_date, end_date=end_date)
 
 # Find cointegrated pairs
-pvalue_matrix, correlation_matrix, top_pairs = find_cointegrated_pairs(df,
-                                                                       cointegration_threshold=cointegration_threshold,
-                                                                       top_n=top_n_pairs)
+if universe_scan:
+    pvalue_matrix, correlation_matrix, top_pairs = find_cointegrated_pairs_universe(
+        df, cointegration_threshold=cointegration_threshold, top_n=top_n_pairs, memory_budget=memory_budget)
+elif parallel_scan:
+    pvalue_matrix, correlation_matrix, top_pairs = find_cointegrated_pairs_parallel(
+        df, cointegration_threshold=cointegration_threshold, top_n=top_n_pairs,
+        min_correlation=min_correlation, n_clusters=n_clusters)
+elif incremental_update:
+    pvalue_matrix, correlation_matrix, top_pairs = find_cointegrated_pairs_incremental(
+        df, start_date, cointegration_threshold=cointegration_threshold, top_n=top_n_pairs)
+else:
+    pvalue_matrix, correlation_matrix, top_pairs = find_cointegrated_pairs(df,
+                                                                           cointegration_threshold=cointegration_threshold,
+                                                                           top_n=top_n_pairs,
+                                                                           min_correlation=min_correlation,
+                                                                           n_clusters=n_clusters)
 
 # Display top N cointegrated pairs
 st.subheader(f'Top {top_n_pairs} Cointegrated Pairs')
 for i, pair in enumerate(top_pairs.iterrows(), start=1):
-    stock1, stock2, pvalue, correlation, stock1_price_data, stock2_price_data = pair[1]
+    stock1, stock2, pvalue, correlation = pair[1][['Stock1', 'Stock2', 'P-Value', 'Correlation']]
     pair_id = f"{stock1.lower()}-{stock2.lower()}"
     st.write(f"{i}. **Pair:** {stock1} - {stock2}, **P-Value:** {pvalue:.4f}, **Correlation:** {correlation:.4f}")
     st.write(f"[*Analyze Pair*](#{pair_id})")
     st.write('---')
 
+# Backtest all top pairs in one batch
+if not top_pairs.empty:
+    stock1_prices = df.values[:, top_pairs['Index1']]
+    stock2_prices = df.values[:, top_pairs['Index2']]
+    backtests = backtest_pairs(stock1_prices, stock2_prices, df.index)
+
 # Display detailed analysis for each pair
-for pair in top_pairs.iterrows():
-    stock1, stock2, pvalue, correlation, stock1_price_data, stock2_price_data = pair[1]
+for k, pair in enumerate(top_pairs.iterrows()):
+    stock1, stock2, pvalue, correlation = pair[1][['Stock1', 'Stock2', 'P-Value', 'Correlation']]
+    stock1_price_data, stock2_price_data = pair_prices(df, pair[1])
     pair_id = f"{stock1.lower()}-{stock2.lower()}"
     st.write(f'<h2 id="{pair_id}">{stock1} - {stock2}</h2>', unsafe_allow_html=True)
     st.write(f"**Pair:** {stock1} - {stock2}")
     st.write(f"**P-Value:** {pvalue:.4f}")
     st.write(f"**Correlation:** {correlation:.4f}")
 
-    # Backtest the pair and display results
-    backtest_results = backtest_pair(stock1_price_data, stock2_price_data)
+    # Display backtest results
+    backtest_results = pair_result(backtests, k)
     st.write(f"**Cumulative Returns:** {backtest_results['cum_rets'].iat[-1]:.2f}")
     st.write(f"**Sharpe Ratio:** {backtest_results['sharpe']:.2f}")
     st.write(f"**CAGR:** {backtest_results['CAGR']:.2%}")
@@ -285,5 +293,37 @@ for pair in top_pairs.iterrows():
     fig.add_trace(go.Scatter(x=stock1_price_data.index, y=stock1_price_data.values, mode='lines', name=stock1))
     fig.add_trace(go.Scatter(x=stock2_price_data.index, y=stock2_price_data.values, mode='lines', name=stock2))
     fig.update_layout(title='Stock Prices', xaxis_title='Date', yaxis_title='Price')
-    st.plotly_chart(fig)
+    st.plotly_chart(decimate_figure(fig))
     st.write('---')
+
+# Sweep entry/exit z-scores and look-back windows for all top pairs
+if parameter_sweep and not top_pairs.empty:
+    st.subheader('Parameter Sweep')
+    entry_range = st.slider('Entry Z-Score range', 0.5, 4.0, (1.0, 3.0), 0.1)
+    exit_range = st.slider('Exit Z-Score range', -1.5, 1.5, (-0.5, 0.5), 0.05)
+    grid_points = st.slider('Grid points per threshold', 5, 30, 20)
+    window_mode = st.radio('Look-back window', ('Half-life', 'Grid'), horizontal=True)
+    if window_mode == 'Grid':
+        window_range = st.slider('Look-back window range (days)', 2, 120, (5, 60))
+        window_points = st.slider('Window grid points', 2, 20, 10)
+        windows = sorted(set(np.linspace(*window_range, window_points).round().astype(int).tolist()))
+    else:
+        windows = [None]
+
+    metric = st.radio('Metric', ('Sharpe', 'CAGR'), horizontal=True)
+    window_index = 0
+    if len(windows) > 1:
+        window_index = windows.index(st.select_slider('Look-back window shown (days)', options=windows))
+
+    entry_zs = np.linspace(*entry_range, grid_points)
+    exit_zs = np.linspace(*exit_range, grid_points)
+    sweep = sweep_pairs(stock1_prices, stock2_prices, df.index, entry_zs, exit_zs, windows)
+    values = sweep['sharpe' if metric == 'Sharpe' else 'CAGR'][window_index]
+
+    for k, pair in enumerate(top_pairs.iterrows()):
+        stock1, stock2 = pair[1]['Stock1'], pair[1]['Stock2']
+        fig = go.Figure(go.Heatmap(z=values[:, :, k], x=exit_zs.round(2), y=entry_zs.round(2),
+                                   colorscale='RdYlGn', colorbar=dict(title=metric)))
+        fig.update_layout(title=f'{stock1} - {stock2} {metric}', xaxis_title='Exit Z-Score',
+                          yaxis_title='Entry Z-Score')
+        st.plotly_chart(fig)
@@ -5,9 +5,13 @@ from datetime import date
 import pandas as pd
 import yfinance as yf
 import streamlit as st
-from prophet import Prophet
 from prophet.plot import plot_plotly
 from plotly import graph_objs as go
+from utils.batch_forecast import load_forecast_table
+from utils.decimate import decimate_figure
+from utils.prophet_cache import component_figure
+from utils.prophet_cv import cross_validate, horizon_metrics, rolling_cutoffs
+from utils.prophet_pool import forecast_concurrently
 
 
 # Function to load historical stock data
@@ -30,7 +34,7 @@ def plot_raw_data():
         xaxis_rangeslider_visible=True,
         height=400
     )
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(decimate_figure(fig), use_container_width=True)
 
 
 # Function to plot backtest forecast
@@ -42,7 +46,14 @@ def plot_backtest():
         yaxis_title='Close Price (USD)',
         height=500
     )
-    st.plotly_chart(fig_backtest, use_container_width=True)
+    st.plotly_chart(decimate_figure(fig_backtest), use_container_width=True)
+
+
+# Function to plot the trend and seasonality components of the backtest forecast
+def plot_backtest_components():
+    fig_components = component_figure(ticker, df_train_backtest, m_backtest, forecast_backtest)
+    fig_components.layout.update(title_text=f'{ticker} Backtest Components')
+    st.plotly_chart(decimate_figure(fig_components), use_container_width=True)
 
 
 # Function to plot backtest comparison
@@ -55,7 +66,7 @@ def plot_backtest_comparison():
         yaxis_title='Close Price (USD)',
         height=400
     )
-    st.plotly_chart(fig_compare, use_container_width=True)
+    st.plotly_chart(decimate_figure(fig_compare), use_container_width=True)
 
 
 # Function to plot future forecast
@@ -67,7 +78,65 @@ def plot_future():
         yaxis_title='Close Price (USD)',
         height=500
     )
-    st.plotly_chart(fig_future, use_container_width=True)
+    st.plotly_chart(decimate_figure(fig_future), use_container_width=True)
+
+
+# Function to plot the trend and seasonality components of the future forecast
+def plot_future_components():
+    fig_components = component_figure(ticker, df_train_future, m_future, forecast_future)
+    fig_components.layout.update(title_text=f'{ticker} Forecast Components')
+    st.plotly_chart(decimate_figure(fig_components), use_container_width=True)
+
+
+# Function to cross-validate the forecast at rolling cutoffs and show the errors by horizon
+def show_cross_validation(history, n_cutoffs, horizon_days):
+    st.subheader('**Rolling-origin evaluation**')
+    cutoffs = rolling_cutoffs(history['ds'], n_cutoffs, horizon_days)
+    if not len(cutoffs):
+        st.warning("Select an earlier start year: cross-validation needs three horizons of training data plus one to test.")
+        return
+    with st.spinner(f'Fitting {len(cutoffs)} cutoffs...'):
+        results = cross_validate(ticker, history, cutoffs, horizon_days)
+    metrics = horizon_metrics(results)
+    st.write(f"{len(cutoffs)} cutoffs from {cutoffs[0]:%Y-%m-%d} to {cutoffs[-1]:%Y-%m-%d}, "
+             f"average MAPE {(results['yhat'] - results['y']).abs().div(results['y']).mean():.2%}")
+
+    fig_cv = go.Figure()
+    fig_cv.add_trace(go.Scatter(x=metrics['Horizon (days)'], y=metrics['MAPE'], name='MAPE'))
+    fig_cv.layout.update(
+        title_text=f'{ticker} Forecast Error by Horizon',
+        xaxis_title='Horizon (days)',
+        yaxis_title='MAPE',
+        yaxis_tickformat='.0%',
+        height=400
+    )
+    st.plotly_chart(decimate_figure(fig_cv), use_container_width=True)
+    st.dataframe(metrics, hide_index=True, use_container_width=True)
+
+
+# Function to browse the stored batch forecasts without refitting
+def show_batch_forecasts():
+    table = load_forecast_table()
+    if table.empty:
+        st.info("No batch forecasts yet. Run `python -m utils.batch_forecast AAPL MSFT ...` from the app folder.")
+        return
+    st.caption(f"{len(table)} tickers, forecasts as of {table['As_Of'].max():%Y-%m-%d}")
+    st.dataframe(table.sort_values('Expected_Return', ascending=False), hide_index=True, use_container_width=True)
+
+    # Expected return at the horizon with the forecast interval as error bars
+    table = table.sort_values('Expected_Return')
+    lower = table['yhat_lower'] / table['Last_Close'] - 1
+    upper = table['yhat_upper'] / table['Last_Close'] - 1
+    fig = go.Figure(go.Bar(x=table['Expected_Return'], y=table['Ticker'], orientation='h',
+                           error_x=dict(type='data', symmetric=False, array=upper - table['Expected_Return'],
+                                        arrayminus=table['Expected_Return'] - lower)))
+    fig.layout.update(
+        title_text='Forecast Return at Horizon',
+        xaxis_title='Expected Return',
+        xaxis_tickformat='.0%',
+        height=max(400, 20 * len(table))
+    )
+    st.plotly_chart(fig, use_container_width=True)
 
 
 with st.sidebar.expander("ℹ️ Information", expanded=False):
@@ -83,118 +152,124 @@ st.header('FB Prophet Forecasting')
 # List of popular stock tickers
 stocks = ('AAPL', 'AMZN', 'BABA', 'GOOGL', 'JNJ', 'JPM', 'META', 'MSFT', 'V')
 
-# User input for selecting a stock either from the list or entering a custom ticker
-ticker_option = st.radio("Select ticker", ("Choose from list", "Enter custom ticker"))
-
-if ticker_option == "Choose from list":
-    ticker = st.selectbox('Select stock ticker', stocks)
-else:
-    ticker = st.text_input('Enter stock ticker', '').upper()
-
-# Check if ticker is provided
-if ticker:
-    try:
-        # Determine the full company name
-        stock_info = yf.Ticker(ticker)
-        company_name = stock_info.info['longName']
-
-        # Show selected company name
-        st.subheader(f'{company_name}')
-
-        # Years for backtesting
-        n_years_backtest = st.slider('Years for backtesting:', 1, 4)
-        period_backtest = n_years_backtest * 365
-
-        # Years for future prediction
-        n_years_future = st.slider('Years for future prediction:', 1, 4)
-        period_future = n_years_future * 365
-
-        # Fetch historical data for the selected stock
-        historical_data = yf.download(ticker, TODAY - pd.DateOffset(years=11), TODAY)
-        min_start_year = historical_data.index.min().year
-        max_start_year = TODAY.year
-
-        # Determine the first possible year with data available on January 1st
-        first_year_with_data = historical_data[historical_data.index.month == 1].index.min().year
-
-        # Set default start year to be 5 years ago if possible, otherwise use the first possible year
-        default_start_year = max(TODAY.year - 5, first_year_with_data)
-
-        # Start date selection
-        start_year = st.slider('Select start year:', first_year_with_data, max_start_year, default_start_year)
-        START = f'{start_year}-01-01'
-
-        # Check if there are enough years for backtesting
-        if TODAY.year - start_year < n_years_backtest:
-            st.warning(f"Please select an earlier start year or reduce the number of years for backtesting to {TODAY.year - start_year} year(s).")
-        else:
-            # Display a loading message while caching historical stock data
-            data = load_data(ticker, START, TODAY.strftime("%Y-%m-%d"))
-
-            # Plot raw data
-            plot_raw_data()
-
-            # Split data into training and testing sets
-            test_data_end_date = TODAY
-            test_data_start_date = TODAY.replace(year=TODAY.year - n_years_backtest)
-            train_data = data[data['Date'] <= test_data_start_date.strftime("%Y-%m-%d")]
-            test_data = data[(data['Date'] > test_data_start_date.strftime("%Y-%m-%d")) &
-                             (data['Date'] <= test_data_end_date.strftime("%Y-%m-%d"))]
-
-            # Backtesting with Prophet
-            df_train_backtest = train_data[['Date', 'Close']]
-            df_train_backtest = df_train_backtest.rename(columns={"Date": "ds", "Close": "y"})
-
-            m_backtest = Prophet()
-            m_backtest.fit(df_train_backtest)
-            future_backtest = m_backtest.make_future_dataframe(periods=period_backtest)
-            forecast_backtest = m_backtest.predict(future_backtest)
-
-            # Backtest header
-            st.subheader('**Backtest**')
-
-            # Plot backtest forecast
-            plot_backtest()
-
-            # Backtest components
-            backtest_expander = st.expander("**Backtest components**", expanded=False)
-
-            with backtest_expander:
-                # Plot components of the backtest forecast
-                backtest_components = m_backtest.plot_components(forecast_backtest)
-                st.write(backtest_components)
-
-            # Compare backtest forecast with actual values
-            compare_df = pd.merge(test_data[['Date', 'Close']], forecast_backtest[['ds', 'yhat']], how='inner', left_on='Date',
-                                  right_on='ds')
-
-            # Plot backtest comparison
-            plot_backtest_comparison()
-
-            # Future prediction with Prophet
-            df_train_future = data[['Date', 'Close']]
-            df_train_future = df_train_future.rename(columns={"Date": "ds", "Close": "y"})
-
-            m_future = Prophet()
-            m_future.fit(df_train_future)
-            future_future = m_future.make_future_dataframe(periods=period_future)
-            forecast_future = m_future.predict(future_future)
-
-            # Future header
-            st.subheader('**Future**')
-
-            # Plot future forecast
-            plot_future()
-
-            # Forecast components
-            forecast_expander = st.expander("**Forecast components**", expanded=False)
-
-            with forecast_expander:
-                # Plot components of the future forecast
-                forecast_components = m_future.plot_components(forecast_future)
-                st.write(forecast_components)
+# Forecast one ticker interactively, or browse the stored forecasts of a batch run
+mode = st.radio("Mode", ("Single ticker", "Batch forecasts"), horizontal=True)
 
-    except Exception as e:
-        st.warning("Enter a correct stock ticker, e.g. 'AAPL' above and hit Enter.")
+if mode == "Batch forecasts":
+    show_batch_forecasts()
 else:
-    st.warning("Enter a stock ticker to start forecasting.")
+    # User input for selecting a stock either from the list or entering a custom ticker
+    ticker_option = st.radio("Select ticker", ("Choose from list", "Enter custom ticker"))
+
+    if ticker_option == "Choose from list":
+        ticker = st.selectbox('Select stock ticker', stocks)
+    else:
+        ticker = st.text_input('Enter stock ticker', '').upper()
+
+    # Check if ticker is provided
+    if ticker:
+        try:
+            # Determine the full company name
+            stock_info = yf.Ticker(ticker)
+            company_name = stock_info.info['longName']
+
+            # Show selected company name
+            st.subheader(f'{company_name}')
+
+            # Years for backtesting
+            n_years_backtest = st.slider('Years for backtesting:', 1, 4)
+            period_backtest = n_years_backtest * 365
+
+            # Years for future prediction
+            n_years_future = st.slider('Years for future prediction:', 1, 4)
+            period_future = n_years_future * 365
+
+            # Fetch historical data for the selected stock
+            historical_data = yf.download(ticker, TODAY - pd.DateOffset(years=11), TODAY)
+            min_start_year = historical_data.index.min().year
+            max_start_year = TODAY.year
+
+            # Determine the first possible year with data available on January 1st
+            first_year_with_data = historical_data[historical_data.index.month == 1].index.min().year
+
+            # Set default start year to be 5 years ago if possible, otherwise use the first possible year
+            default_start_year = max(TODAY.year - 5, first_year_with_data)
+
+            # Start date selection
+            start_year = st.slider('Select start year:', first_year_with_data, max_start_year, default_start_year)
+            START = f'{start_year}-01-01'
+
+            # Check if there are enough years for backtesting
+            if TODAY.year - start_year < n_years_backtest:
+                st.warning(f"Please select an earlier start year or reduce the number of years for backtesting to {TODAY.year - start_year} year(s).")
+            else:
+                # Display a loading message while caching historical stock data
+                data = load_data(ticker, START, TODAY.strftime("%Y-%m-%d"))
+
+                # Plot raw data
+                plot_raw_data()
+
+                # Split data into training and testing sets
+                test_data_end_date = TODAY
+                test_data_start_date = TODAY.replace(year=TODAY.year - n_years_backtest)
+                train_data = data[data['Date'] <= test_data_start_date.strftime("%Y-%m-%d")]
+                test_data = data[(data['Date'] > test_data_start_date.strftime("%Y-%m-%d")) &
+                                 (data['Date'] <= test_data_end_date.strftime("%Y-%m-%d"))]
+
+                # Training windows: up to the backtest start, and the full history for the future forecast
+                df_train_backtest = train_data[['Date', 'Close']]
+                df_train_backtest = df_train_backtest.rename(columns={"Date": "ds", "Close": "y"})
+                df_train_future = data[['Date', 'Close']]
+                df_train_future = df_train_future.rename(columns={"Date": "ds", "Close": "y"})
+
+                # Reserve the sections in page order, since either model may finish first
+                backtest_section = st.container()
+                future_section = st.container()
+
+                # Fit both models and predict concurrently, reusing cached models when the training window is unchanged
+                jobs = {'backtest': (df_train_backtest, period_backtest), 'future': (df_train_future, period_future)}
+                for name, model, forecast in forecast_concurrently(ticker, jobs):
+                    if name == 'backtest':
+                        m_backtest, forecast_backtest = model, forecast
+
+                        with backtest_section:
+                            # Backtest header
+                            st.subheader('**Backtest**')
+
+                            # Plot backtest forecast
+                            plot_backtest()
+
+                            # Backtest components, only built when asked for
+                            if st.checkbox("Show backtest components", value=False):
+                                plot_backtest_components()
+
+                            # Compare backtest forecast with actual values
+                            compare_df = pd.merge(test_data[['Date', 'Close']], forecast_backtest[['ds', 'yhat']], how='inner',
+                                                  left_on='Date', right_on='ds')
+
+                            # Plot backtest comparison
+                            plot_backtest_comparison()
+                    else:
+                        m_future, forecast_future = model, forecast
+
+                        with future_section:
+                            # Future header
+                            st.subheader('**Future**')
+
+                            # Plot future forecast
+                            plot_future()
+
+                            # Forecast components, only built when asked for
+                            if st.checkbox("Show forecast components", value=False):
+                                plot_future_components()
+
+                # Rolling-origin evaluation over many cutoffs of the full history
+                if st.checkbox('Rolling-origin evaluation', value=False,
+                               help='Refit at many past cutoffs and score each forecast over the backtest horizon.'):
+                    n_cutoffs = st.slider('Number of cutoffs', 5, 40, 20)
+                    show_cross_validation(df_train_future, n_cutoffs, period_backtest)
+
+        except Exception as e:
+            st.warning("Enter a correct stock ticker, e.g. 'AAPL' above and hit Enter.")
+    else:
+        st.warning("Enter a stock ticker to start forecasting.")
@@ -1,100 +1,58 @@
-# Standard Libraries
-import datetime
-
 # External Libraries
+import numpy as np
 import pandas as pd
 import yfinance as yf
 import streamlit as st
 import plotly.graph_objects as go
 import nltk
-from urllib.request import urlopen, Request
-from bs4 import BeautifulSoup
 nltk.download('vader_lexicon')
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
+from utils.headline_store import add_headlines, load_headlines, load_sentiment_buckets, new_headlines
+from utils.html_parse import parse_news_page
+from utils.news_fetch import fetch_news_pages
+from utils.sentiment_batch import score_headlines
 
 
-# Function to get news from FinViz
+# Function to get the news of a ticker from FinViz as a DataFrame of Datetime and Headline,
+# or None if the page has no news table
 def get_news(ticker):
-    finviz_url = 'https://finviz.com/quote.ashx?t='
-    url = finviz_url + ticker
-    req = Request(url=url, headers={'User-Agent': 'Mozilla/5.0'})
-    response = urlopen(req)
-    html = BeautifulSoup(response, 'html.parser')
-    news_table = html.find(id='news-table')
-    return news_table
-
-
-# Parse news into DataFrame
-def parse_news(news_table):
-    parsed_news = []
-
-    for x in news_table.findAll('tr'):
-        try:
-            text = x.a.get_text()
-            date_scrape = x.td.text.split()
-
-            if len(date_scrape) == 1:
-                time = date_scrape[0]
-            else:
-                date = date_scrape[0]
-                time = date_scrape[1]
-
-            # Specify date and time formats
-            datetime_string = f"{date}-{time}"
-            datetime_obj = datetime.datetime.strptime(datetime_string, "%b-%d-%y-%I:%M%p")
-            parsed_news.append([datetime_obj, text])
-        except Exception as e:
-            print(f"Error parsing news: {e}")
+    pages, failures = fetch_news_pages([ticker])
+    if ticker not in pages:
+        raise RuntimeError(failures[ticker])
+    return parse_news_page(pages[ticker])
 
-    columns = ['Datetime', 'Headline']
-    parsed_news_df = pd.DataFrame(parsed_news, columns=columns)
-    return parsed_news_df
 
+# Score news sentiment. Only headlines the store has not seen are scored; the scored history
+# from start on is then read back from the store.
+def score_news(parsed_news_df, ticker, start=None):
+    new_news_df = new_headlines(ticker, parsed_news_df)
+    if not new_news_df.empty:
+        scores = score_headlines(new_news_df['Headline'].tolist())
+        add_headlines(ticker, new_news_df.assign(**scores))
 
-# Score news sentiment
-def score_news(parsed_news_df):
-    vader = SentimentIntensityAnalyzer()
-    scores = parsed_news_df['Headline'].apply(vader.polarity_scores).tolist()
-    scores_df = pd.DataFrame(scores)
-
-    parsed_and_scored_news = parsed_news_df.join(scores_df, rsuffix='_right')
-    parsed_and_scored_news = parsed_and_scored_news.set_index('Datetime')
-
-    # Check if 'Date' and 'Time' columns exist before dropping them
-    if 'Date' in parsed_and_scored_news.columns and 'Time' in parsed_and_scored_news.columns:
-        parsed_and_scored_news = parsed_and_scored_news.drop(['Date', 'Time'], axis=1)
-
+    parsed_and_scored_news = load_headlines(ticker, start)
     parsed_and_scored_news = parsed_and_scored_news.rename(columns={"compound": "Sentiment Score"})
 
     return parsed_and_scored_news
 
 
-# Plot hourly sentiment
-def plot_hourly_sentiment(parsed_and_scored_news, ticker):
-    # Select only numeric columns for resampling
-    numeric_columns = parsed_and_scored_news.select_dtypes(include='number')
-
-    # Calculate mean sentiment scores
-    mean_scores = numeric_columns.resample('H').mean()
-
-    # Define custom color scale for the bar chart
-    def get_color(score):
-        if score > 0:
-            return f'rgba(0, {int(score*255)}, 0, 0.7)'  # Green gradient
-        elif score < 0:
-            return f'rgba({int(-score*255)}, 0, 0, 0.7)'  # Red gradient
-        else:
-            return 'rgba(255, 255, 255, 0.7)'  # White for neutral sentiment
+# Function to color sentiment bars: a green gradient for positive scores, a red gradient for
+# negative ones and white for neutral
+def sentiment_colors(scores):
+    level = (scores.abs() * 255).fillna(0).astype(int).astype(str)
+    return np.select([scores > 0, scores < 0],
+                     ['rgba(0, ' + level + ', 0, 0.7)', 'rgba(' + level + ', 0, 0, 0.7)'],
+                     'rgba(255, 255, 255, 0.7)')
 
-    colors = mean_scores['Sentiment Score'].apply(get_color)
 
+# Function to plot bucketed mean sentiment scores as colored bars
+def plot_sentiment_buckets(mean_scores, title, xaxis_title):
     fig = go.Figure()
     fig.add_trace(go.Bar(x=mean_scores.index, y=mean_scores['Sentiment Score'],
-                         marker=dict(color=colors)),
+                         marker=dict(color=sentiment_colors(mean_scores['Sentiment Score']))),
                   )
 
-    fig.update_layout(title=ticker + ' Hourly Sentiment Scores',
-                      xaxis_title="Time",
+    fig.update_layout(title=title,
+                      xaxis_title=xaxis_title,
                       yaxis_title="Sentiment Score")
 
     # Set x-axis date format
@@ -105,40 +63,51 @@ def plot_hourly_sentiment(parsed_and_scored_news, ticker):
     return fig
 
 
-# Plot daily sentiment
-def plot_daily_sentiment(parsed_and_scored_news, ticker):
-    # Select only numeric columns for resampling
-    numeric_columns = parsed_and_scored_news.select_dtypes(include='number')
-
-    # Calculate mean sentiment scores
-    mean_scores = numeric_columns.resample('D').mean()
-
-    # Define custom color scale for the bar chart
-    def get_color(score):
-        if score > 0:
-            return f'rgba(0, {int(score*255)}, 0, 0.7)'  # Green gradient
-        elif score < 0:
-            return f'rgba({int(-score*255)}, 0, 0, 0.7)'  # Red gradient
-        else:
-            return 'rgba(255, 255, 255, 0.7)'  # White for neutral sentiment
-
-    colors = mean_scores['Sentiment Score'].apply(get_color)
-
-    fig = go.Figure()
-    fig.add_trace(go.Bar(x=mean_scores.index, y=mean_scores['Sentiment Score'],
-                         marker=dict(color=colors)),
-                  )
-
-    fig.update_layout(title=ticker + ' Daily Sentiment Scores',
-                      xaxis_title="Date",
-                      yaxis_title="Sentiment Score")
-
-    # Set x-axis date format
-    fig.update_layout(xaxis=dict(tickmode='linear',
-                                 tickformat='%Y-%m-%d',
-                                 tickvals=pd.date_range(mean_scores.index.min(), mean_scores.index.max(), freq='D')))
-
-    return fig
+# Plot hourly sentiment from the stored hourly aggregates
+def plot_hourly_sentiment(ticker, start=None):
+    mean_scores = load_sentiment_buckets(ticker, 'H', start)
+    return plot_sentiment_buckets(mean_scores, ticker + ' Hourly Sentiment Scores', "Time")
+
+
+# Plot daily sentiment from the stored daily aggregates
+def plot_daily_sentiment(ticker, start=None):
+    mean_scores = load_sentiment_buckets(ticker, 'D', start)
+    return plot_sentiment_buckets(mean_scores, ticker + ' Daily Sentiment Scores', "Date")
+
+
+# Function to fetch, score and compare the latest FinViz headlines of a whole watchlist
+def show_watchlist_sentiment(watchlist):
+    with st.spinner(f'Fetching news for {len(watchlist)} tickers...'):
+        pages, failures = fetch_news_pages(watchlist)
+    if failures:
+        st.warning(f"Could not fetch news for: {', '.join(sorted(failures))}")
+
+    rows = []
+    for ticker in watchlist:
+        parsed_news_df = parse_news_page(pages[ticker]) if ticker in pages else None
+        if parsed_news_df is None or parsed_news_df.empty:
+            continue
+        # Only the headlines currently on the page, not the stored history
+        scores = score_news(parsed_news_df, ticker, parsed_news_df['Datetime'].min())['Sentiment Score']
+        latest = scores.index.max()
+        rows.append({
+            'Ticker': ticker,
+            'Headlines': len(scores),
+            'Latest Headline': latest,
+            'Mean Sentiment': scores.mean(),
+            'Last 24h Sentiment': scores[scores.index > latest - pd.Timedelta(days=1)].mean(),
+        })
+    if not rows:
+        st.warning("No news headlines found for the watchlist.")
+        return
+    table = pd.DataFrame(rows).sort_values('Mean Sentiment')
+
+    fig = go.Figure(go.Bar(x=table['Mean Sentiment'], y=table['Ticker'], orientation='h',
+                           marker=dict(color=table['Mean Sentiment'], colorscale='RdYlGn', cmin=-1, cmax=1)))
+    fig.update_layout(title='Mean Sentiment of the Latest Headlines', xaxis_title='Sentiment Score',
+                      height=max(400, 20 * len(table)))
+    st.plotly_chart(fig)
+    st.dataframe(table.sort_values('Mean Sentiment', ascending=False), hide_index=True, use_container_width=True)
 
 
 with st.sidebar.expander("ℹ️ Information", expanded=False):
@@ -151,44 +120,59 @@ st.header("News Sentiment Analyzer")
 # List of popular stock tickers
 stocks = ('AAPL', 'AMZN', 'BABA', 'GOOGL', 'JNJ', 'JPM', 'META', 'MSFT', 'V')
 
-# User input for selecting a stock either from the list or entering a custom ticker
-ticker_option = st.radio("Select ticker", ("Choose from list", "Enter custom ticker"))
+# Analyse one ticker in detail, or compare the latest sentiment across a watchlist
+mode = st.radio("Mode", ("Single ticker", "Watchlist dashboard"), horizontal=True)
 
-if ticker_option == "Choose from list":
-    ticker = st.selectbox('Select stock ticker', stocks)
+if mode == "Watchlist dashboard":
+    watchlist_text = st.text_area('Watchlist (tickers separated by commas, spaces or new lines)', ', '.join(stocks))
+    watchlist = list(dict.fromkeys(watchlist_text.replace(',', ' ').upper().split()))
+    if watchlist:
+        show_watchlist_sentiment(watchlist)
+    else:
+        st.warning("Enter at least one ticker to compare.")
 else:
-    ticker = st.text_input('Enter stock ticker', '').upper()
-
-# Check if ticker is provided
-if ticker:
-    try:
-        # Determine the full company name
-        stock_info = yf.Ticker(ticker)
-        company_name = stock_info.info['longName']
+    # User input for selecting a stock either from the list or entering a custom ticker
+    ticker_option = st.radio("Select ticker", ("Choose from list", "Enter custom ticker"))
+
+    if ticker_option == "Choose from list":
+        ticker = st.selectbox('Select stock ticker', stocks)
+    else:
+        ticker = st.text_input('Enter stock ticker', '').upper()
+
+    # Headlines are stored as they are scored, so the charts can look back further than FinViz shows
+    history_days = st.slider('Days of headline history', 1, 365, 30)
+
+    # Check if ticker is provided
+    if ticker:
+        try:
+            # Determine the full company name
+            stock_info = yf.Ticker(ticker)
+            company_name = stock_info.info['longName']
         
-        # Show selected company name
-        st.subheader(f'{company_name}')
-        news_table = get_news(ticker)
+            # Show selected company name
+            st.subheader(f'{company_name}')
+            parsed_news_df = get_news(ticker)
         
-        if news_table:
-            parsed_news_df = parse_news(news_table)
-            if not parsed_news_df.empty:
-                parsed_and_scored_news = score_news(parsed_news_df)
-                fig_hourly = plot_hourly_sentiment(parsed_and_scored_news, ticker)
-                fig_daily = plot_daily_sentiment(parsed_and_scored_news, ticker)
-
-                st.plotly_chart(fig_hourly)
-                st.plotly_chart(fig_daily)
-
-                # Display table with customized column labels
-                st.subheader('**News Headlines and Sentiment Scores**')
-                st.write(parsed_and_scored_news.reset_index().rename(
-                    columns={"Datetime": "Date Time", "compound": "Sentiment Score"}))
+            if parsed_news_df is not None:
+                if not parsed_news_df.empty:
+                    # Read back the stored history up to the chosen number of days before the latest headline
+                    start = parsed_news_df['Datetime'].max() - pd.Timedelta(days=history_days)
+                    parsed_and_scored_news = score_news(parsed_news_df, ticker, start)
+                    fig_hourly = plot_hourly_sentiment(ticker, start)
+                    fig_daily = plot_daily_sentiment(ticker, start)
+
+                    st.plotly_chart(fig_hourly)
+                    st.plotly_chart(fig_daily)
+
+                    # Display table with customized column labels
+                    st.subheader('**News Headlines and Sentiment Scores**')
+                    st.write(parsed_and_scored_news.reset_index().rename(
+                        columns={"Datetime": "Date Time", "compound": "Sentiment Score"}))
+                else:
+                    st.warning("No news headlines found for the provided ticker.")
             else:
-                st.warning("No news headlines found for the provided ticker.")
-        else:
-            st.warning("No news found for the provided ticker.")
-    except Exception as e:
-        st.warning("Enter a correct stock ticker, e.g. 'AAPL' above and hit Enter.")
-else:
-    st.warning("Enter a stock ticker to start analyzing news sentiment.")
+                st.warning("No news found for the provided ticker.")
+        except Exception as e:
+            st.warning("Enter a correct stock ticker, e.g. 'AAPL' above and hit Enter.")
+    else:
+        st.warning("Enter a stock ticker to start analyzing news sentiment.")
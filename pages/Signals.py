@@ -1,5 +1,5 @@
 # Standard Libraries
-from datetime import date
+from datetime import date, timedelta
 
 # External Libraries
 import pandas as pd
@@ -8,8 +8,13 @@ import streamlit as st
 from plotly import graph_objs as go
 import plotly.graph_objects as go
 import numpy as np
-from sklearn.cluster import KMeans
-import ta
+import time
+from utils.decimate import MAX_POINTS, decimate_figure
+from utils.indicators import COLUMNS, append_indicators, indicator_frame, step_indicators
+from utils.price_cache import get_price_panel
+from utils.signal_backtest import backtest_signals, sweep_signals
+from utils.signals import screen_signals
+from utils.sr_zones import update_zone_state, zone_centers, zone_membership
 
 
 # Function to load historical stock data
@@ -20,6 +25,33 @@ def load_data(ticker, start_date, end_date):
     return data.set_index('Date')
 
 
+# Function to keep intraday bars and their indicators up to date between live reruns.
+# Completed bars are appended to the saved indicator state; the newest bar is still forming,
+# so it is evaluated on a copy of the state and replaced on the next tick.
+def load_live_data(ticker, interval):
+    key = f'live_{ticker}_{interval}'
+    live = st.session_state.get(key)
+    if live is None:
+        bars = yf.download(ticker, period=LIVE_PERIODS[interval], interval=interval, progress=False)
+        completed, forming = bars.iloc[:-1], bars.iloc[-1:]
+        indicators, state = indicator_frame(completed['Close'])
+        live = {'bars': completed, 'indicators': indicators, 'state': state}
+    else:
+        latest = yf.download(ticker, period='1d', interval=interval, progress=False)
+        new_bars = latest[latest.index > live['bars'].index[-1]]
+        completed, forming = new_bars.iloc[:-1], new_bars.iloc[-1:]
+        if len(completed):
+            indicators, state = append_indicators(live['indicators'], live['state'], completed['Close'])
+            live = {'bars': pd.concat([live['bars'], completed]), 'indicators': indicators, 'state': state}
+    st.session_state[key] = live
+
+    data = live['bars'].join(live['indicators'])
+    if len(forming):
+        _, values = step_indicators(live['state'], forming['Close'].iat[-1])
+        data = pd.concat([data, forming.assign(**values)])
+    return data
+
+
 # Function to plot raw data
 def plot_raw_data():
     fig = go.Figure()
@@ -31,32 +63,32 @@ def plot_raw_data():
         yaxis_title='Price (USD)',
         xaxis_rangeslider_visible=True,
         height=400)
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(decimate_figure(fig, x_range=x_range), use_container_width=True)
 
 
 # Function to find SR zones
-def find_sr_zones(stock_data, num_clusters):
-    closes = stock_data['Close'].values.reshape(-1, 1)
-
-    # Apply KMeans clustering
-    kmeans = KMeans(n_clusters=num_clusters, random_state=42).fit(closes)
-
-    # Get cluster centers
-    cluster_centers = kmeans.cluster_centers_.flatten()
-
-    # Sort cluster centers to get potential SR zones
-    sr_zones = np.sort(cluster_centers)
+def find_sr_zones(stock_data, num_clusters, forming_bar=False):
+    # Keep the sorted closes between reruns so appended bars are merged instead of re-sorted.
+    # In live mode the last bar is still forming and changes on the next refresh, so zones come from the bars before it.
+    completed = stock_data.iloc[:-1] if forming_bar else stock_data
+    key = f'sr_zones_{ticker}_{stock_data.index[0]}'
+    state = update_zone_state(st.session_state.get(key), completed['Close'].values, completed.index)
+    st.session_state[key] = state
+
+    # Optimal 1-D clustering of the closes, over price bins a tenth of the zone width, gives the
+    # same zones on every rerun and matches the watchlist screener
+    sr_zones = zone_centers(state, num_clusters, zone_width_pct / 10)
 
     # Create SR zone columns in the dataset
-    for i, zone in enumerate(sr_zones):
-        stock_data[f'SR_Zone_{i + 1}'] = (stock_data['Close'] > zone - Zonewidth) & (
-                    stock_data['Close'] < zone + Zonewidth)
+    membership = zone_membership(stock_data['Close'].values, sr_zones, zone_width_pct)
+    for i in range(len(sr_zones)):
+        stock_data[f'SR_Zone_{i + 1}'] = membership[:, i]
 
     return stock_data
 
 
 # Function to generate trading signals
-def generate_trading_signals(data, num_clusters):
+def generate_trading_signals(data):
     # Buy Signal conditions
     buy_conditions = (data['RSI'] < 30) & (data['Close'] < data['LowerBand'])
 
@@ -64,7 +96,9 @@ def generate_trading_signals(data, num_clusters):
     sell_conditions = (data['RSI'] > 70) & (data['Close'] > data['UpperBand'])
 
     # Take Action Signal conditions within SR zones
-    take_action_conditions = data[[f'SR_Zone_{i + 1}' for i in range(num_clusters)]].any(axis=1) & (
+    # Closes that bin into fewer distinct prices than num_clusters give fewer zones
+    zone_columns = [column for column in data.columns if column.startswith('SR_Zone_')]
+    take_action_conditions = data[zone_columns].any(axis=1) & (
                 (data['RSI'] < 30) | (data['RSI'] > 70) | (data['Close'] < data['LowerBand']) | (
                     data['Close'] > data['UpperBand'])
                 )
@@ -78,7 +112,7 @@ def generate_trading_signals(data, num_clusters):
 
 
 # Function to plot SR zones with signals
-def plot_sr_zones_with_signals(stock_data, num_clusters):
+def plot_sr_zones_with_signals(stock_data):
     # Plot stock prices with Bollinger Bands
     fig1 = go.Figure()
     fig1.add_trace(go.Scatter(x=stock_data.index, y=stock_data['Close'], name='Close Price'))
@@ -88,11 +122,13 @@ def plot_sr_zones_with_signals(stock_data, num_clusters):
     fig1.add_trace(go.Scatter(x=stock_data.index, y=stock_data['LowerBand'], name='Lower BB',
                               line=dict(color='royalblue')))
 
-    for i in range(1, num_clusters + 1):
-        zone_column = f'SR_Zone_{i}'
+    zone_columns = [column for column in stock_data.columns if column.startswith('SR_Zone_')]
+    for i, zone_column in enumerate(zone_columns, start=1):
         zone_price = stock_data.loc[stock_data[zone_column], 'Close'].mean()
-        fig1.add_trace(go.Scatter(x=stock_data.index, y=[zone_price] * len(stock_data), name=f'SR Zone {i}',
-                                  mode='lines', line=dict(color='lightgray', dash='dash')))
+        # A horizontal line shape spans the chart without sending a point per bar
+        if not np.isnan(zone_price):
+            fig1.add_hline(y=zone_price, line=dict(color='lightgray', dash='dash'), annotation_text=f'SR Zone {i}',
+                           annotation_position='top left')
 
     # Highlight Buy signals
     fig1.add_trace(go.Scatter(x=stock_data[stock_data['Buy_Signal']].index,
@@ -109,7 +145,7 @@ def plot_sr_zones_with_signals(stock_data, num_clusters):
     fig1.update_layout(xaxis_title='Date', yaxis_title='Price (USD)', showlegend=True, height=600,
                        title_text=f"{ticker} Stock Price with SR Zones, Bollinger Bands, and Signals",
                        xaxis_rangeslider_visible=True)
-    st.plotly_chart(fig1, use_container_width=True)
+    st.plotly_chart(decimate_figure(fig1, x_range=x_range), use_container_width=True)
 
 
 # Function to plot RSI analysis
@@ -137,7 +173,105 @@ def plot_rsi_analysis(stock_data):
 
     fig2.update_layout(xaxis_title='Date', yaxis_title='RSI', showlegend=True, height=500, title_text=f"{ticker} RSI Analysis",
                        xaxis_rangeslider_visible=True)
-    st.plotly_chart(fig2, use_container_width=True)
+    st.plotly_chart(decimate_figure(fig2, x_range=x_range), use_container_width=True)
+
+
+# Function to pick a zoom window for long histories. Charts are downsampled to about MAX_POINTS
+# points per line, so narrowing the dates re-decimates the window at full detail.
+def zoom_range(index, step):
+    if len(index) <= MAX_POINTS:
+        return None
+    first, last = index[0].to_pydatetime(), index[-1].to_pydatetime()
+    if index.tz is not None:
+        first, last = first.replace(tzinfo=None), last.replace(tzinfo=None)
+    window = st.slider('Zoom to dates', first, last, (first, last), step=step)
+    if window == (first, last):
+        return None
+    if index.tz is not None:
+        return tuple(pd.Timestamp(value).tz_localize(index.tz) for value in window)
+    return window
+
+
+# Function to screen a watchlist for tickers whose latest bar fires a signal
+def screen_watchlist(watchlist, start_date, end_date):
+    started = time.perf_counter()
+    close, failures = get_price_panel(watchlist, 'Close', start_date, end_date)
+    for symbol, error in failures.items():
+        st.error(f"An error occurred while fetching data for symbol {symbol}: {error}")
+    missing = [symbol for symbol in watchlist if symbol not in close.columns or close[symbol].isna().all()]
+    if missing:
+        st.warning(f"No data available for: {', '.join(missing)}. Skipping...")
+
+    table = screen_signals(close, num_clusters, zone_width_pct)
+    st.caption(f"Screened {len(watchlist) - len(missing)} tickers in {time.perf_counter() - started:.2f} s")
+    if table.empty:
+        st.info("No ticker in the watchlist is currently firing a signal.")
+    else:
+        st.dataframe(table, hide_index=True, use_container_width=True)
+
+
+# Function to backtest the signals and show the performance statistics
+def show_signal_backtest(stock_data):
+    st.subheader('Signal Backtest')
+    allow_short = st.checkbox('Go short on sell signals', value=False)
+    confirm_zones = st.checkbox('Only trade signals inside SR zones', value=False)
+    results = backtest_signals(stock_data, allow_short, confirm_zones)
+
+    st.write(f"**Total Return:** {results['total_return']:.2%}")
+    st.write(f"**Sharpe Ratio:** {results['sharpe']:.2f}")
+    st.write(f"**Max Drawdown:** {results['max_drawdown']:.2%}")
+    st.write(f"**Hit Rate:** {results['hit_rate']:.2%}")
+    st.write(f"**Number of Trades:** {results['num_trades']}")
+    st.write(f"**Time in Market:** {results['exposure']:.2%}")
+
+    # Plot the strategy equity against buying and holding
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=stock_data.index[1:], y=results['equity'], name='Signal Strategy'))
+    fig.add_trace(go.Scatter(x=stock_data.index[1:], y=stock_data['Close'].values[1:] / stock_data['Close'].iat[0],
+                             name='Buy & Hold', line=dict(color='lightgray')))
+    fig.update_layout(title_text=f'{ticker} Signal Strategy Equity', xaxis_title='Date', yaxis_title='Growth of 1 USD',
+                      height=400)
+    st.plotly_chart(decimate_figure(fig, x_range=x_range), use_container_width=True)
+
+    if st.checkbox('Parameter sweep', value=False,
+                   help='Backtest the rules over a grid of RSI thresholds, Bollinger multipliers and SR zone counts.'):
+        grid_points = st.slider('Grid points per RSI threshold', 3, 15, 7)
+        rsi_buy_range = st.slider('RSI buy threshold range', 5, 50, (20, 40))
+        rsi_sell_range = st.slider('RSI sell threshold range', 50, 95, (60, 80))
+        multiplier_range = st.slider('Bollinger multiplier range', 0.5, 4.0, (1.0, 3.0), 0.25)
+        cluster_range = st.slider('SR zone count range', 2, 12, (3, 7))
+
+        sweep = sweep_signals(stock_data['Close'], np.linspace(*rsi_buy_range, grid_points),
+                              np.linspace(*rsi_sell_range, grid_points),
+                              np.arange(multiplier_range[0], multiplier_range[1] + 0.125, 0.25),
+                              range(cluster_range[0], cluster_range[1] + 1), zone_width_pct, allow_short, confirm_zones)
+
+        # Rank every combination by Sharpe ratio
+        grid = np.meshgrid(sweep['cluster_counts'], sweep['band_multipliers'], sweep['rsi_buy_levels'],
+                           sweep['rsi_sell_levels'], indexing='ij')
+        table = pd.DataFrame({
+            'SR Zones': grid[0].ravel(),
+            'BB Multiplier': grid[1].ravel(),
+            'RSI Buy': grid[2].ravel(),
+            'RSI Sell': grid[3].ravel(),
+            'Total Return': sweep['total_return'].ravel(),
+            'Sharpe': sweep['sharpe'].ravel(),
+            'Max Drawdown': sweep['max_drawdown'].ravel(),
+            'Hit Rate': sweep['hit_rate'].ravel(),
+            'Trades': sweep['num_trades'].ravel(),
+        })
+        st.dataframe(table.sort_values('Sharpe', ascending=False).head(20), hide_index=True,
+                     use_container_width=True)
+
+        # Sharpe over the RSI thresholds for the best zone count and multiplier
+        c, m, _, _ = np.unravel_index(np.nanargmax(sweep['sharpe']), sweep['sharpe'].shape)
+        fig = go.Figure(go.Heatmap(z=sweep['sharpe'][c, m], x=sweep['rsi_sell_levels'].round(1),
+                                   y=sweep['rsi_buy_levels'].round(1), colorscale='RdYlGn',
+                                   colorbar=dict(title='Sharpe')))
+        fig.update_layout(title_text=f"Sharpe with {sweep['cluster_counts'][c]} SR zones and "
+                                     f"{sweep['band_multipliers'][m]:.2f} x BB",
+                          xaxis_title='RSI Sell Threshold', yaxis_title='RSI Buy Threshold')
+        st.plotly_chart(fig, use_container_width=True)
 
 
 with st.sidebar.expander("ℹ️ Information", expanded=False):
@@ -151,62 +285,105 @@ TODAY = date.today()
 # Set up Streamlit app title
 st.header('Buy & Sell Signals')
 
+# Look-back period fetched when live mode starts, per intraday bar interval
+LIVE_PERIODS = {'1m': '5d', '2m': '1mo', '5m': '1mo', '15m': '1mo'}
+
 # List of popular stock tickers
 stocks = ('AAPL', 'AMZN', 'BABA', 'GOOGL', 'JNJ', 'JPM', 'META', 'MSFT', 'V')
 
-# User input for selecting a stock either from the list or entering a custom ticker
-ticker_option = st.radio("Select ticker", ("Choose from list", "Enter custom ticker"))
-
-if ticker_option == "Choose from list":
-    ticker = st.selectbox('Select stock ticker', stocks)
-else:
-    ticker = st.text_input('Enter stock ticker', '').upper()
-
-# Check if a ticker is provided
-if ticker:
-    try:
-        # Fetch historical data for the selected stock
-        historical_data = yf.download(ticker, TODAY - pd.DateOffset(years=10), TODAY)
-        min_start_year = historical_data.index.min().year
-        max_start_year = TODAY.year
-
-        # Determine the first possible year with data available on January 1st
-        first_year_with_data = historical_data[historical_data.index.month == 1].index.min().year
-
-        # Set default start year to be 1 year ago if possible, otherwise use the first possible year
-        default_start_year = max(TODAY.year - 1, first_year_with_data)
-
-        # Slider for choosing the start date
-        start_year = st.slider('Select start year:', TODAY.year - 10, TODAY.year, default_start_year)
-        START = f'{start_year}-01-01'
-
-        # Display a loading message while caching historical stock data
-        data = load_data(ticker, START, TODAY.strftime("%Y-%m-%d"))
-
-        # Plot raw data
-        plot_raw_data()
-
-        # Calculate RSI
-        data['RSI'] = ta.momentum.RSIIndicator(data['Close'], window=14).rsi()
-
-        # Calculate Bollinger Bands
-        data['MA20'] = data['Close'].rolling(window=20).mean()
-        data['UpperBand'] = data['MA20'] + 2 * data['Close'].rolling(window=20).std()
-        data['LowerBand'] = data['MA20'] - 2 * data['Close'].rolling(window=20).std()
-
-        # Find support and resistance zones and add them as columns
-        num_clusters = 5  # Set the desired number of clusters (SR zones)
-        Zonewidth = 15  # Set the width of the SD zones. This can also be a percentage of the current stock price.
-        data = find_sr_zones(data, num_clusters)
+# Date window the charts are zoomed to; None shows the whole history
+x_range = None
 
-        # Generate trading signals
-        data = generate_trading_signals(data, num_clusters)
+# Support and resistance zone settings
+num_clusters = 5  # Set the desired number of clusters (SR zones)
+zone_width_pct = st.slider('SR zone width (% of zone price)', 0.5, 20.0, 5.0, 0.5)
 
-        # Plot stock prices with SR zones, Bollinger Bands, and RSI
-        plot_sr_zones_with_signals(data, num_clusters)
-        plot_rsi_analysis(data)
+# Analyse one ticker in detail, or screen a whole watchlist for the latest signals
+mode = st.radio("Mode", ("Single ticker", "Watchlist screener"), horizontal=True)
 
-    except Exception as e:
-        st.warning("Enter a correct stock ticker, e.g. 'AAPL' above and hit Enter.")
+if mode == "Watchlist screener":
+    watchlist_text = st.text_area('Watchlist (tickers separated by commas, spaces or new lines)', ', '.join(stocks))
+    watchlist = list(dict.fromkeys(watchlist_text.replace(',', ' ').upper().split()))
+    start_year = st.slider('Select start year:', TODAY.year - 10, TODAY.year, TODAY.year - 1)
+    if watchlist:
+        screen_watchlist(watchlist, f'{start_year}-01-01', TODAY)
+    else:
+        st.warning("Enter at least one ticker to screen.")
 else:
-    st.warning("Enter a stock ticker to start analyzing buy and sell signals.")
+    # User input for selecting a stock either from the list or entering a custom ticker
+    ticker_option = st.radio("Select ticker", ("Choose from list", "Enter custom ticker"))
+
+    if ticker_option == "Choose from list":
+        ticker = st.selectbox('Select stock ticker', stocks)
+    else:
+        ticker = st.text_input('Enter stock ticker', '').upper()
+
+    # Live mode follows intraday bars and refreshes the indicators every few seconds
+    live_mode = st.checkbox('Live refresh (intraday)', value=False)
+    if live_mode:
+        interval = st.selectbox('Bar interval', tuple(LIVE_PERIODS))
+        refresh_seconds = st.slider('Refresh every (seconds)', 2, 60, 5)
+
+    # Check if a ticker is provided
+    if ticker and live_mode:
+        try:
+            data = load_live_data(ticker, interval)
+            x_range = zoom_range(data.index, timedelta(minutes=1))
+            plot_raw_data()
+
+            # Find support and resistance zones, merging in the new bars, and generate trading signals
+            data = find_sr_zones(data, num_clusters, forming_bar=True)
+            data = generate_trading_signals(data)
+            plot_sr_zones_with_signals(data)
+            plot_rsi_analysis(data)
+            st.caption(f"Last bar {data.index[-1]}, next refresh in {refresh_seconds} s")
+            time.sleep(refresh_seconds)
+            st.rerun()
+
+        except Exception as e:
+            st.warning("Enter a correct stock ticker, e.g. 'AAPL' above and hit Enter.")
+    elif ticker:
+        try:
+            # Fetch historical data for the selected stock
+            historical_data = yf.download(ticker, TODAY - pd.DateOffset(years=10), TODAY)
+            min_start_year = historical_data.index.min().year
+            max_start_year = TODAY.year
+
+            # Determine the first possible year with data available on January 1st
+            first_year_with_data = historical_data[historical_data.index.month == 1].index.min().year
+
+            # Set default start year to be 1 year ago if possible, otherwise use the first possible year
+            default_start_year = max(TODAY.year - 1, first_year_with_data)
+
+            # Slider for choosing the start date
+            start_year = st.slider('Select start year:', TODAY.year - 10, TODAY.year, default_start_year)
+            START = f'{start_year}-01-01'
+
+            # Display a loading message while caching historical stock data
+            data = load_data(ticker, START, TODAY.strftime("%Y-%m-%d"))
+            x_range = zoom_range(data.index, timedelta(days=1))
+
+            # Plot raw data
+            plot_raw_data()
+
+            # Calculate RSI and Bollinger Bands in one pass over the closes
+            indicators, _ = indicator_frame(data['Close'])
+            data[COLUMNS] = indicators
+
+            # Find support and resistance zones and add them as columns
+            data = find_sr_zones(data, num_clusters)
+
+            # Generate trading signals
+            data = generate_trading_signals(data)
+
+            # Plot stock prices with SR zones, Bollinger Bands, and RSI
+            plot_sr_zones_with_signals(data)
+            plot_rsi_analysis(data)
+
+            # Measure what the signals would have earned
+            show_signal_backtest(data)
+
+        except Exception as e:
+            st.warning("Enter a correct stock ticker, e.g. 'AAPL' above and hit Enter.")
+    else:
+        st.warning("Enter a stock ticker to start analyzing buy and sell signals.")
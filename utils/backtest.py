@@ -0,0 +1,203 @@
+# Vectorized pairs trading backtester.
+#
+# Prices come in as (dates x pairs) arrays and every step of the single-pair backtest
+# (Kalman hedge ratio, half-life, rolling z-score, entries/exits, returns and statistics)
+# is computed for all pairs at once with array operations.
+
+from math import sqrt
+
+import numpy as np
+import pandas as pd
+
+from utils.kalman import kalman_average, kalman_regression
+
+
+# Function to compute the Kalman hedge ratios and spreads for all pairs
+def pair_spreads(x, y):
+    state_means = kalman_regression(kalman_average(x), kalman_average(y))
+    hedge_ratio = -state_means[..., 0]
+    spread = y + x * hedge_ratio
+    return hedge_ratio, spread
+
+
+# Function to estimate the half-life of mean reversion of each spread column
+def half_lives(spread):
+    spread_lag = np.vstack([spread[:1], spread[:-1]])
+    spread_ret = spread - spread_lag
+    spread_ret[0] = spread_ret[1]
+    lag_dev = spread_lag - spread_lag.mean(axis=0)
+    ret_dev = spread_ret - spread_ret.mean(axis=0)
+    slope = (lag_dev * ret_dev).sum(axis=0) / (lag_dev * lag_dev).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        halflife = np.round(-np.log(2) / slope)
+    halflife[~np.isfinite(halflife) | (halflife <= 0)] = 1
+    return halflife.astype(int)
+
+
+# Function to compute rolling sums over a different window length per column
+def _rolling_sum(values, windows):
+    cumsum = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+    rows = np.arange(1, values.shape[0] + 1)[:, None]
+    start = rows - windows[None, :]
+    columns = np.arange(values.shape[1])[None, :]
+    total = cumsum[rows, columns] - cumsum[np.maximum(start, 0), columns]
+    total[start < 0] = np.nan
+    return total
+
+
+# Function to compute z-scores against a rolling mean/std with one window length per column
+def rolling_zscores(spread, windows):
+    windows = np.broadcast_to(np.asarray(windows, dtype=int), spread.shape[1:])
+    # Centre each column first to keep the running sums well conditioned
+    centred = spread - spread.mean(axis=0)
+    sums = _rolling_sum(centred, windows)
+    squares = _rolling_sum(centred * centred, windows)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = sums / windows
+        var = np.maximum(squares - sums * mean, 0) / (windows - 1)
+        return (centred - mean) / np.sqrt(var)
+
+
+# Function to hold `value` from each entry until the next exit (exits win on the same row).
+# Comparing the last entry row with the last exit row avoids a forward fill over the full
+# broadcast shape, so entry-only and exit-only arrays stay small in a parameter sweep.
+def _hold(entries, exits, value):
+    row = np.arange(entries.shape[0]).reshape((-1,) + (1,) * (entries.ndim - 1))
+    last_entry = np.maximum.accumulate(np.where(entries, row, -1), axis=0)
+    last_exit = np.maximum.accumulate(np.where(exits, row, 0), axis=0)
+    return np.where(last_entry > last_exit, value, 0.)
+
+
+# Function to turn z-scores into long/short entries and the resulting number of units held
+def positions(zscore, entry_z, exit_z):
+    previous = np.concatenate([np.full((1,) + zscore.shape[1:], np.nan), zscore[:-1]])
+    with np.errstate(invalid='ignore'):
+        long_entry = (zscore < -entry_z) & (previous > -entry_z)
+        long_exit = (zscore > -exit_z) & (previous < -exit_z)
+        short_entry = (zscore > entry_z) & (previous < entry_z)
+        short_exit = (zscore < exit_z) & (previous > exit_z)
+    units = _hold(long_entry, long_exit, 1.) + _hold(short_entry, short_exit, -1.)
+    return units, long_entry, short_entry
+
+
+# Function to count trades as new long entries, or new short entries on rows without a new long entry
+def count_trades(long_entry, short_entry):
+    new_long = long_entry[1:] & ~long_entry[:-1]
+    new_short = short_entry[1:] & ~short_entry[:-1] & ~new_long
+    return new_long.sum(axis=0) + new_short.sum(axis=0)
+
+
+# Function to compute the percentage change of each spread relative to the gross position value
+def spread_returns(x, y, hedge_ratio, spread):
+    spread_change = np.full(spread.shape, np.nan)
+    spread_change[1:] = (spread[1:] - spread[:-1]) / (x[1:] * np.abs(hedge_ratio[1:]) + y[1:])
+    return spread_change
+
+
+# Function to compute returns, Sharpe ratio and CAGR from the units held in each spread
+def performance(spread_change, units, days):
+    port_rets = np.full(np.broadcast_shapes(spread_change.shape, units.shape), np.nan)
+    port_rets[1:] = spread_change[1:] * units[:-1]
+    cum_rets = np.full(port_rets.shape, np.nan)
+    cum_rets[1:] = np.cumsum(port_rets[1:], axis=0) + 1
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = port_rets[1:].mean(axis=0) / port_rets[1:].std(axis=0, ddof=1) * sqrt(252)
+        cagr = cum_rets[-1] ** (252.0 / days) - 1
+    return port_rets, cum_rets, sharpe, cagr
+
+
+# Function to backtest many pairs at once; x and y are (dates x pairs) price arrays
+def backtest_pairs(x, y, dates, entry_z=1.5, exit_z=-0.05):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    dates = pd.to_datetime(dates)
+
+    hedge_ratio, spread = pair_spreads(x, y)
+    halflife = half_lives(spread)
+    zscore = rolling_zscores(spread, halflife)
+    units, long_entry, short_entry = positions(zscore, entry_z, exit_z)
+    spread_change = spread_returns(x, y, hedge_ratio, spread)
+    port_rets, cum_rets, sharpe, cagr = performance(spread_change, units, (dates[-1] - dates[0]).days)
+
+    return {
+        'cum_rets': pd.DataFrame(cum_rets, index=dates),
+        'sharpe': sharpe,
+        'CAGR': cagr,
+        'num_trades': count_trades(long_entry, short_entry),
+        'halflife': halflife,
+        'entryZscore': entry_z,
+        'exitZscore': exit_z,
+        'average_hedge_ratio': hedge_ratio.mean(axis=0),
+    }
+
+
+# Function to pick the results of one pair out of a batch backtest
+def pair_result(results, k):
+    return {
+        'cum_rets': results['cum_rets'].iloc[:, k],
+        'sharpe': results['sharpe'][k],
+        'CAGR': results['CAGR'][k],
+        'num_trades': int(results['num_trades'][k]),
+        'halflife': int(results['halflife'][k]),
+        'entryZscore': results['entryZscore'],
+        'exitZscore': results['exitZscore'],
+        'average_hedge_ratio': results['average_hedge_ratio'][k],
+    }
+
+
+# Function to compute Sharpe ratio and CAGR from sums, without materialising per-row returns
+def _summary(spread_change, units, days):
+    change = spread_change[1:]
+    held = units[:-1]
+    n = change.shape[0]
+    total = np.einsum('t...,t...->...', change, held)
+    # Units are -1, 0 or 1, so squared returns only need |units|
+    squares = np.einsum('t...,t...->...', change * change, np.abs(held))
+    mean = total / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.sqrt(np.maximum(squares - n * mean * mean, 0) / (n - 1))
+        sharpe = mean / std * sqrt(252)
+        cagr = (total + 1) ** (252.0 / days) - 1
+    return sharpe, cagr
+
+
+# Function to backtest all pairs over a grid of entry/exit z-scores and look-back windows.
+# Spreads and hedge ratios are computed once, rolling statistics once per window, and all
+# entry/exit combinations are evaluated together. A window of None uses each pair's half-life.
+def sweep_pairs(x, y, dates, entry_zs, exit_zs, windows=(None,), max_elements=4_000_000):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    dates = pd.to_datetime(dates)
+    entry_zs = np.asarray(entry_zs, dtype=float)
+    exit_zs = np.asarray(exit_zs, dtype=float)
+    days = (dates[-1] - dates[0]).days
+
+    hedge_ratio, spread = pair_spreads(x, y)
+    spread_change = spread_returns(x, y, hedge_ratio, spread)[:, None, None, :]
+    halflife = half_lives(spread)
+
+    shape = (len(windows), len(entry_zs), len(exit_zs), x.shape[1])
+    sharpe = np.empty(shape)
+    cagr = np.empty(shape)
+    num_trades = np.empty(shape, dtype=int)
+
+    # Evaluate as many entry thresholds at a time as fit in the element budget
+    chunk = max(1, max_elements // (x.shape[0] * len(exit_zs) * x.shape[1]))
+    for w, window in enumerate(windows):
+        zscore = rolling_zscores(spread, halflife if window is None else window)[:, None, None, :]
+        for start in range(0, len(entry_zs), chunk):
+            entry = entry_zs[start:start + chunk, None, None]
+            units, long_entry, short_entry = positions(zscore, entry, exit_zs[None, :, None])
+            sharpe[w, start:start + chunk], cagr[w, start:start + chunk] = _summary(spread_change, units, days)
+            num_trades[w, start:start + chunk] = count_trades(long_entry, short_entry)
+
+    return {
+        'sharpe': sharpe,
+        'CAGR': cagr,
+        'num_trades': num_trades,
+        'entry_zs': entry_zs,
+        'exit_zs': exit_zs,
+        'windows': list(windows),
+        'halflife': halflife,
+    }
@@ -0,0 +1,144 @@
+# Nightly Prophet forecasts for a whole watchlist.
+#
+# Run from the repository root with `python -m utils.batch_forecast AAPL MSFT ...` or
+# `python -m utils.batch_forecast --file watchlist.txt`. Closes for all tickers come from
+# the shared price cache in one request, then every ticker runs the FB Prophet page's
+# pipeline (a backtest fit on all but the last years and a fit on the full window) in a
+# bounded process pool. Each ticker becomes one row of a small Parquet table with the
+# forecast at the horizon, its bounds and the backtest error, which the page browses
+# without refitting.
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from utils.price_cache import get_price_panel
+from utils.prophet_pool import fit_and_forecast
+
+FORECAST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'forecasts',
+                             'forecasts.parquet')
+
+# Defaults matching the FB Prophet page: five years of history, one year of backtest and of forecast
+HISTORY_YEARS = 5
+BACKTEST_YEARS = 1
+HORIZON_DAYS = 365
+
+# Workers are capped so a nightly run leaves the host usable
+MAX_WORKERS = 4
+
+
+# Function to forecast one ticker from its close series and summarise it as one table row
+def forecast_ticker(ticker, close, backtest_years=BACKTEST_YEARS, horizon_days=HORIZON_DAYS):
+    history = pd.DataFrame({'ds': close.index, 'y': close.values})
+    backtest_start = pd.Timestamp(history['ds'].iat[-1]) - pd.DateOffset(years=backtest_years)
+    train = history[history['ds'] <= backtest_start]
+    test = history[history['ds'] > backtest_start]
+    if len(train) < 2 or test.empty:
+        raise ValueError(f'not enough history for a {backtest_years} year backtest')
+
+    # Backtest: fit before the test window and compare the forecast with the actual closes
+    _, forecast_backtest = fit_and_forecast(ticker, train, backtest_years * 365, {})
+    compare = test.merge(forecast_backtest[['ds', 'yhat']], on='ds')
+    errors = compare['yhat'] - compare['y']
+
+    # Future: fit the full window and keep the forecast at the horizon
+    _, forecast_future = fit_and_forecast(ticker, history, horizon_days, {})
+    last = forecast_future.iloc[-1]
+    last_close = history['y'].iat[-1]
+    return {
+        'Ticker': ticker,
+        'As_Of': history['ds'].iat[-1],
+        'Last_Close': last_close,
+        'Horizon': last['ds'],
+        'yhat': last['yhat'],
+        'yhat_lower': last['yhat_lower'],
+        'yhat_upper': last['yhat_upper'],
+        'Expected_Return': last['yhat'] / last_close - 1,
+        'Backtest_MAPE': (errors.abs() / compare['y']).mean(),
+        'Backtest_RMSE': np.sqrt((errors ** 2).mean()),
+    }
+
+
+# Function to load the forecast table, or an empty table if no batch has run yet
+def load_forecast_table(path=FORECAST_PATH):
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_parquet(path)
+
+
+# Function to merge new rows into the forecast table, replacing earlier rows of the same tickers
+def save_forecast_table(rows, path=FORECAST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = load_forecast_table(path)
+    new = pd.DataFrame(rows)
+    if not table.empty:
+        table = pd.concat([table[~table['Ticker'].isin(new['Ticker'])], new], ignore_index=True)
+    else:
+        table = new
+    table.sort_values('Ticker').reset_index(drop=True).to_parquet(path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+# Function to forecast a watchlist in a process pool, yielding (ticker, row or None, error or None) as tickers finish
+def forecast_watchlist(tickers, history_years=HISTORY_YEARS, backtest_years=BACKTEST_YEARS,
+                       horizon_days=HORIZON_DAYS, max_workers=MAX_WORKERS):
+    today = date.today()
+    closes, failures = get_price_panel(tickers, 'Close', f'{today.year - history_years}-01-01', today)
+    available = []
+    for ticker in tickers:
+        if ticker in closes.columns and not closes[ticker].dropna().empty:
+            available.append(ticker)
+        else:
+            yield ticker, None, failures.get(ticker, 'no price data')
+    if not available:
+        return
+    # Spawn fresh workers so the pool behaves the same when started from the Streamlit server
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(available)), mp_context=get_context('spawn')) as executor:
+        futures = {executor.submit(forecast_ticker, ticker, closes[ticker].dropna(), backtest_years, horizon_days):
+                   ticker for ticker in available}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, str(e)
+
+
+# Function to run a batch from the command line and write the forecast table
+def main():
+    parser = argparse.ArgumentParser(description='Forecast a watchlist with Prophet and store the results.')
+    parser.add_argument('tickers', nargs='*', help='tickers to forecast')
+    parser.add_argument('--file', help='file with tickers separated by commas, spaces or new lines')
+    parser.add_argument('--history-years', type=int, default=HISTORY_YEARS)
+    parser.add_argument('--backtest-years', type=int, default=BACKTEST_YEARS)
+    parser.add_argument('--horizon-days', type=int, default=HORIZON_DAYS)
+    parser.add_argument('--workers', type=int, default=min(MAX_WORKERS, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    tickers = [ticker.upper() for ticker in args.tickers]
+    if args.file:
+        with open(args.file) as f:
+            tickers += f.read().replace(',', ' ').upper().split()
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        parser.error('give tickers or --file')
+
+    started = time.perf_counter()
+    rows = []
+    for done, (ticker, row, error) in enumerate(forecast_watchlist(tickers, args.history_years, args.backtest_years,
+                                                                   args.horizon_days, args.workers), 1):
+        if row is not None:
+            rows.append(row)
+        print(f'[{done}/{len(tickers)}] {ticker}: {error or "ok"}', flush=True)
+    if rows:
+        save_forecast_table(rows)
+    print(f'{len(rows)} of {len(tickers)} tickers forecast in {time.perf_counter() - started:.1f} s -> {FORECAST_PATH}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# Batched Engle-Granger cointegration tests over a whole price panel.
+#
+# The results match statsmodels' `coint(y0, y1)` with its defaults (constant in the
+# cointegrating regression, ADF on the residuals without constant, lag length chosen
+# by AIC) but every pair is handled with array operations instead of one call per pair.
+
+import numpy as np
+from scipy.stats import norm
+# MacKinnon (1994) p-value tables, private to statsmodels and read by its mackinnonp. Their names
+# and layout are those of statsmodels 0.14.0, pinned in requirements.txt; check them on upgrades.
+from statsmodels.tsa.adfvalues import _tau_largeps, _tau_maxs, _tau_mins, _tau_smallps, _tau_stars
+
+# Same collinearity cut-off statsmodels uses before running the ADF test
+SQRTEPS = np.sqrt(np.finfo(np.double).eps)
+
+
+# Function to compute MacKinnon's approximate p-values for an array of Engle-Granger statistics
+def mackinnon_pvalues(stats, regression='c', n_series=2):
+    stats = np.asarray(stats, dtype=float)
+    small = np.polyval(np.asarray(_tau_smallps[regression][n_series - 1])[::-1], stats)
+    large = np.polyval(np.asarray(_tau_largeps[regression][n_series - 1])[::-1], stats)
+    pvalues = norm.cdf(np.where(stats <= _tau_stars[regression][n_series - 1], small, large))
+    pvalues = np.where(stats > _tau_maxs[regression][n_series - 1], 1.0, pvalues)
+    return np.where(stats < _tau_mins[regression][n_series - 1], 0.0, pvalues)
+
+
+# Function to list the upper-triangle pair indices in the same order as the nested loop
+def pair_indices(n):
+    return np.triu_indices(n, k=1)
+
+
+# Function to compute the hedge regression residuals of y0 on [y1, const] for many pairs
+def hedge_residuals(prices, left, right):
+    y0 = prices[:, left]
+    y1 = prices[:, right]
+    y0_mean = y0.mean(axis=0)
+    y1_mean = y1.mean(axis=0)
+    y0_dev = y0 - y0_mean
+    y1_dev = y1 - y1_mean
+    sxx = (y1_dev * y1_dev).sum(axis=0)
+    sxy = (y1_dev * y0_dev).sum(axis=0)
+    syy = (y0_dev * y0_dev).sum(axis=0)
+    beta = sxy / sxx
+    resid = y0_dev - y1_dev * beta
+    rsquared = 1 - (resid * resid).sum(axis=0) / syy
+    correlation = sxy / np.sqrt(sxx * syy)
+    return resid, beta, rsquared, correlation
+
+
+# Function to build the ADF design (lagged level plus lagged differences) for each column
+def _adf_design(resid, lags):
+    resid = resid.T
+    diff = np.diff(resid, axis=1)
+    nobs = diff.shape[1] - lags
+    y = diff[:, lags:]
+    columns = [resid[:, lags:-1]]
+    for j in range(1, lags + 1):
+        columns.append(diff[:, lags - j:lags - j + nobs])
+    return np.stack(columns, axis=-1), y
+
+
+# Function to pick the AIC-optimal number of lagged differences for each column
+def _select_lags(resid, maxlag):
+    X, y = _adf_design(resid, maxlag)
+    nobs = y.shape[1]
+    gram = np.matmul(X.transpose(0, 2, 1), X)
+    xty = np.matmul(y[:, None, :], X)[:, 0]
+    yty = (y * y).sum(axis=1)
+
+    # The Cholesky factor of a leading block is the leading block of the full factor,
+    # so one factorisation gives the residual sum of squares of every nested model
+    chol = np.linalg.cholesky(gram)
+    z = np.linalg.solve(chol, xty[..., None])[..., 0]
+    ssr = yty[:, None] - np.cumsum(z * z, axis=1)
+    ssr = np.maximum(ssr, np.finfo(np.double).tiny)
+
+    n_params = np.arange(1, maxlag + 2)
+    aic = nobs * (np.log(2 * np.pi) + np.log(ssr / nobs) + 1) + 2 * n_params
+    return np.argmin(aic, axis=1)
+
+
+# Function to compute the ADF t-statistic of the lagged level for a fixed number of lags
+def _adf_tstat(resid, lags):
+    X, y = _adf_design(resid, lags)
+    _, nobs, k = X.shape
+    gram = np.matmul(X.transpose(0, 2, 1), X)
+    xty = np.matmul(y[:, None, :], X)[:, 0]
+    gram_inv = np.linalg.inv(gram)
+    params = np.matmul(gram_inv, xty[..., None])[..., 0]
+    errors = y - np.matmul(X, params[..., None])[..., 0]
+    sigma2 = (errors * errors).sum(axis=1) / (nobs - k)
+    return params[:, 0] / np.sqrt(sigma2 * gram_inv[:, 0, 0])
+
+
+# Function to run the augmented Dickey-Fuller test (no constant, AIC lag search) per column
+def adf_statistics(resid, maxlag=None):
+    nobs = resid.shape[0]
+    if maxlag is None:
+        maxlag = int(np.ceil(12.0 * np.power(nobs / 100.0, 1 / 4.0)))
+        maxlag = min(nobs // 2 - 1, maxlag)
+
+    best_lags = _select_lags(resid, maxlag)
+    stats = np.empty(resid.shape[1])
+    for lags in np.unique(best_lags):
+        columns = np.flatnonzero(best_lags == lags)
+        stats[columns] = _adf_tstat(resid[:, columns], lags)
+    return stats
+
+
+# Function to compute Engle-Granger statistics, p-values and correlations for many pairs
+def coint_pairs(prices, left, right, chunk_size=1024):
+    prices = np.asarray(prices, dtype=float)
+    n_pairs = len(left)
+    stats = np.empty(n_pairs)
+    pvalues = np.empty(n_pairs)
+    correlations = np.empty(n_pairs)
+
+    # Work through the pairs in chunks so the lagged design matrices stay small
+    for start in range(0, n_pairs, chunk_size):
+        stop = min(start + chunk_size, n_pairs)
+        resid, _, rsquared, correlation = hedge_residuals(prices, left[start:stop], right[start:stop])
+        chunk_stats = np.full(stop - start, -np.inf)
+        valid = rsquared < 1 - 100 * SQRTEPS
+        if valid.any():
+            chunk_stats[valid] = adf_statistics(resid[:, valid])
+        stats[start:stop] = chunk_stats
+        pvalues[start:stop] = mackinnon_pvalues(chunk_stats)
+        correlations[start:stop] = correlation
+    return stats, pvalues, correlations
+
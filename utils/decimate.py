@@ -0,0 +1,94 @@
+# Shape-preserving downsampling of Plotly figures before they are sent to the browser.
+#
+# Long line traces are reduced with largest-triangle-three-buckets (LTTB): the series is
+# cut into buckets and from each bucket the point spanning the largest triangle with the
+# previously kept point and the next bucket's average is kept, which preserves peaks and
+# troughs far better than taking every n-th point. An optional x-range first restricts the
+# traces to a zoom window, so zooming in shows full detail for the visible dates only.
+
+import numpy as np
+import pandas as pd
+
+# Points kept per trace, about the pixel width of a wide chart
+MAX_POINTS = 1500
+
+# Per-point trace attributes that must be thinned together with x and y
+_POINT_ATTRIBUTES = ('text', 'hovertext', 'customdata')
+
+
+# Function to pick the indices LTTB keeps from a series of n points
+def lttb_indices(x, y, n_out):
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    # Bucket i spans edges[i]..edges[i + 1] - 1; the first and last points are always kept
+    edges = np.floor(np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(int) + 1
+    edges[-1] = n - 1
+    sizes = np.diff(edges)
+    average_x = np.add.reduceat(x[:-1], edges[:-1]) / sizes
+    average_y = np.add.reduceat(y[:-1], edges[:-1]) / sizes
+    next_x = np.append(average_x[1:], x[-1])
+    next_y = np.append(average_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+# Function to turn trace x values (numbers, dates or ISO date strings) into floats for the triangle areas
+def _numeric_x(x):
+    values = np.asarray(x)
+    if np.issubdtype(values.dtype, np.number):
+        return values.astype(float)
+    return pd.DatetimeIndex(pd.to_datetime(values, format='ISO8601')).asi8.astype(float)
+
+
+# Function to restrict one scatter trace to an x-range and downsample it in place
+def decimate_trace(trace, max_points=MAX_POINTS, x_range=None):
+    if trace.x is None or trace.y is None or len(trace.x) != len(trace.y):
+        return
+    x = np.asarray(trace.x)
+    y = np.asarray(trace.y, dtype=float)
+    keep = ~np.isnan(y)
+    try:
+        numeric_x = _numeric_x(x)
+    except (TypeError, ValueError):
+        # Category axes have no distances to preserve
+        return
+    if x_range is not None:
+        lo, hi = _numeric_x(list(x_range))
+        inside = np.flatnonzero((numeric_x >= lo) & (numeric_x <= hi))
+        window = np.zeros(len(x), dtype=bool)
+        if len(inside):
+            # Keep one point beyond each edge so lines run to the border of the window
+            window[max(inside[0] - 1, 0):inside[-1] + 2] = True
+        keep &= window
+    rows = np.flatnonzero(keep)
+    if len(rows) == len(x) and len(rows) <= max_points:
+        return
+
+    rows = rows[lttb_indices(numeric_x[rows], y[rows], max_points)]
+    updates = {'x': x[rows], 'y': y[rows]}
+    for name in _POINT_ATTRIBUTES:
+        values = getattr(trace, name, None)
+        if values is not None and not isinstance(values, str) and len(values) == len(x):
+            updates[name] = np.asarray(values, dtype=object)[rows]
+    trace.update(updates)
+
+
+# Function to downsample every scatter trace of a figure and, when zoomed, show only the x-range
+def decimate_figure(fig, max_points=MAX_POINTS, x_range=None):
+    for trace in fig.data:
+        if trace.type in ('scatter', 'scattergl'):
+            decimate_trace(trace, max_points, x_range)
+    if x_range is not None:
+        fig.update_xaxes(range=list(x_range))
+    return fig
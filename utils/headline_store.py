@@ -0,0 +1,136 @@
+# Persistent store of VADER-scored news headlines.
+#
+# Every headline is kept in one SQLite table keyed by ticker and a hash of its datetime and
+# text, with the four VADER scores. A wire headline that recurs on later days is a new row.
+# A run only scores the headlines the store has not seen yet, and the history keeps growing
+# beyond the rows FinViz shows at any moment, so charts can read longer windows without
+# rescoring anything. Next to the headlines, a running sum and count of the compound score
+# is kept per ticker per hour and per day and updated as headlines are added, so charts read
+# finished buckets instead of resampling the whole history on every rerun.
+
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'headlines.sqlite')
+
+SCORE_COLUMNS = ['neg', 'neu', 'pos', 'compound']
+
+# Bucket sizes of the sentiment aggregates, as pandas frequencies
+BUCKET_FREQUENCIES = ('H', 'D')
+
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+# Function to open the store, creating the tables on first use
+def connect(path=None):
+    path = path or DB_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute('''CREATE TABLE IF NOT EXISTS headlines (
+                        ticker TEXT NOT NULL,
+                        hash TEXT NOT NULL,
+                        datetime TEXT NOT NULL,
+                        headline TEXT NOT NULL,
+                        neg REAL, neu REAL, pos REAL, compound REAL,
+                        PRIMARY KEY (ticker, hash))''')
+    conn.execute('CREATE INDEX IF NOT EXISTS headlines_ticker_datetime ON headlines (ticker, datetime)')
+    conn.execute('''CREATE TABLE IF NOT EXISTS sentiment_buckets (
+                        ticker TEXT NOT NULL,
+                        freq TEXT NOT NULL,
+                        bucket TEXT NOT NULL,
+                        total REAL NOT NULL,
+                        count INTEGER NOT NULL,
+                        PRIMARY KEY (ticker, freq, bucket))''')
+    return conn
+
+
+# Function to build the store key of a headline from its stored datetime text and the headline
+def headline_key(datetime_text, headline):
+    return hashlib.sha1(f'{datetime_text} {headline}'.encode('utf-8')).hexdigest()
+
+
+# Function to hash headlines with their datetimes for the store key
+def headline_hashes(datetimes, headlines):
+    return [headline_key(datetime_text, headline)
+            for datetime_text, headline in zip(pd.Series(datetimes).dt.strftime(_TIME_FORMAT), headlines)]
+
+
+# Function to look up which of a ticker's headline hashes are already in the store
+def _known_hashes(conn, ticker, hashes):
+    hashes = list(hashes)
+    known = set()
+    # Look the hashes up in chunks to stay below SQLite's parameter limit
+    for start in range(0, len(hashes), 500):
+        chunk = hashes[start:start + 500]
+        query = f'SELECT hash FROM headlines WHERE ticker = ? AND hash IN ({",".join("?" * len(chunk))})'
+        known.update(row[0] for row in conn.execute(query, [ticker] + chunk))
+    return known
+
+
+# Function to pick the parsed headlines of a ticker that are not in the store yet
+def new_headlines(ticker, parsed_news_df, path=None):
+    hashes = headline_hashes(parsed_news_df['Datetime'], parsed_news_df['Headline'])
+    with closing(connect(path)) as conn:
+        known = _known_hashes(conn, ticker, hashes)
+    is_new = [headline_hash not in known for headline_hash in hashes]
+    # The same headline can appear twice on one page at the same time; keep its first row
+    new = parsed_news_df[is_new].assign(hash=[h for h, keep in zip(hashes, is_new) if keep])
+    return new.drop_duplicates('hash')
+
+
+# Function to add scored headlines with columns Datetime, Headline, hash and the VADER scores,
+# adding the new ones to the hourly and daily sentiment aggregates
+def add_headlines(ticker, scored, path=None):
+    with closing(connect(path)) as conn, conn:
+        # Take the write lock first so no other run adds the same headlines in between
+        conn.execute('BEGIN IMMEDIATE')
+        known = _known_hashes(conn, ticker, scored['hash'])
+        scored = scored[~scored['hash'].isin(known)].drop_duplicates('hash')
+        if scored.empty:
+            return
+
+        rows = zip([ticker] * len(scored), scored['hash'], scored['Datetime'].dt.strftime(_TIME_FORMAT),
+                   scored['Headline'], *(scored[column].astype(float) for column in SCORE_COLUMNS))
+        conn.executemany('INSERT INTO headlines VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+        compound = scored['compound'].astype(float)
+        for freq in BUCKET_FREQUENCIES:
+            buckets = compound.groupby(scored['Datetime'].dt.floor(freq)).agg(['sum', 'count'])
+            conn.executemany('''INSERT INTO sentiment_buckets VALUES (?, ?, ?, ?, ?)
+                                  ON CONFLICT (ticker, freq, bucket)
+                                  DO UPDATE SET total = total + excluded.total, count = count + excluded.count''',
+                             zip([ticker] * len(buckets), [freq] * len(buckets),
+                                 buckets.index.strftime(_TIME_FORMAT), buckets['sum'], buckets['count'].astype(int)))
+
+
+# Function to load a ticker's scored headlines from a start datetime on, indexed by Datetime
+def load_headlines(ticker, start=None, path=None):
+    query = 'SELECT datetime, headline, neg, neu, pos, compound FROM headlines WHERE ticker = ?'
+    params = [ticker]
+    if start is not None:
+        query += ' AND datetime >= ?'
+        params.append(pd.Timestamp(start).strftime(_TIME_FORMAT))
+    with closing(connect(path)) as conn:
+        table = pd.read_sql_query(query + ' ORDER BY datetime DESC', conn, params=params)
+    table.columns = ['Datetime', 'Headline'] + SCORE_COLUMNS
+    table['Datetime'] = pd.to_datetime(table['Datetime'])
+    return table.set_index('Datetime')
+
+
+# Function to load a ticker's hourly ('H') or daily ('D') sentiment buckets from a start datetime
+# on, indexed by bucket start, with the mean Sentiment Score and the number of headlines
+def load_sentiment_buckets(ticker, freq, start=None, path=None):
+    query = 'SELECT bucket, total, count FROM sentiment_buckets WHERE ticker = ? AND freq = ?'
+    params = [ticker, freq]
+    if start is not None:
+        # The bucket holding start is included whole
+        query += ' AND bucket >= ?'
+        params.append(pd.Timestamp(start).floor(freq).strftime(_TIME_FORMAT))
+    with closing(connect(path)) as conn:
+        table = pd.read_sql_query(query + ' ORDER BY bucket', conn, params=params)
+    table.index = pd.DatetimeIndex(pd.to_datetime(table['bucket']), name='Datetime')
+    return pd.DataFrame({'Sentiment Score': table['total'] / table['count'], 'Headlines': table['count']})
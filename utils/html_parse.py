@@ -0,0 +1,127 @@
+# Targeted HTML parsing of the FinViz news table and the AlphaSpread valuation pages.
+#
+# Only the parts of a page that are read are handed to a parser. Elements are cut out of the
+# page text by following their opening and closing tags, skipping comments and script and
+# style bodies, so the cut-out markup is exactly what a full parse would see. The FinViz news
+# table is parsed on its own with lxml, and its date/time column is parsed for all rows at
+# once. For AlphaSpread pages, the element the CSS selectors start from is parsed with
+# html.parser, which builds the same tree as the full html.parser parse the selectors were
+# written against; lxml repairs malformed markup differently and could match other elements.
+# If a selector finds nothing there, the whole page is parsed again.
+
+import re
+from datetime import date
+
+import lxml.html
+import pandas as pd
+from bs4 import BeautifulSoup
+
+# Comments and script and style bodies, whose text can look like tags without being markup
+OPAQUE_PATTERN = r'<!--.*?-->|<script\b.*?</script\s*>|<style\b.*?</style\s*>'
+
+# Opening tag of the FinViz news table
+NEWS_TABLE_PATTERN = r'<table\b[^>]*\sid\s*=\s*["\']?news-table(?=["\'\s/>])'
+
+# FinViz date and time format, e.g. "Mar-01-24 10:15AM"
+NEWS_DATETIME_FORMAT = '%b-%d-%y %I:%M%p'
+
+# CSS selectors of the values read from each AlphaSpread page, and the id of the element
+# all selectors of a page start from
+ALPHASPREAD_SELECTORS = {
+    'summary': ('main', {
+        'current_price': "#main > div:nth-child(4) > div:nth-child(1) > div > div:nth-child(3) > div > div > div.ten.wide.computer.sixteen.wide.tablet.flex-column.mobile-no-horizontal-padding.column > div:nth-child(1) > div > div:nth-child(2) > p > span:nth-child(5)",
+        'intrinsic_value': "#main > div:nth-child(4) > div:nth-child(1) > div > div:nth-child(3) > div > div > div.six.wide.computer.sixteen.wide.tablet.center.aligned.flex-column.mobile-no-horizontal-padding.column.appear.only-opacity > div:nth-child(1) > div > div:nth-child(1) > div.ui.intrinsic-value-color.no-margin.valuation-scenario-value.header.restriction-sensitive-data",
+    }),
+    'estimates': ('main', {
+        'estimate_low': "#main > div:nth-child(3) > div:nth-child(1) > div > div:nth-child(3) > div > div:nth-child(7) > div:nth-child(1) > div.right-aligned > div.ui.header",
+        'estimate_avg': "#main > div:nth-child(3) > div:nth-child(1) > div > div:nth-child(3) > div > div:nth-child(7) > div:nth-child(3) > div.right-aligned > div.ui.header",
+        'estimate_high': "#main > div:nth-child(3) > div:nth-child(1) > div > div:nth-child(3) > div > div:nth-child(7) > div:nth-child(5) > div.right-aligned > div.ui.header",
+    }),
+    'dcf': ('scenario-valuation', {
+        'dcf_value': "#scenario-valuation > div.no-sticky-part > div > div:nth-child(1) > div > div:nth-child(1) > div.ui.dcf-value-color.no-margin.valuation-scenario-value.header.restriction-sensitive-data",
+    }),
+}
+
+
+# Function to build the pattern of an opening tag with the given id
+def id_pattern(element_id):
+    return rf'<[a-zA-Z][\w-]*\b[^>]*\sid\s*=\s*["\']?{re.escape(element_id)}(?=["\'\s/>])'
+
+
+# Function to cut the first element whose opening tag matches start_pattern out of a page, up
+# to the tag that closes it, or None if the page has no such element
+def element_html(html, start_pattern):
+    for match in re.finditer(f'{OPAQUE_PATTERN}|(?P<start>{start_pattern})', html, re.DOTALL | re.IGNORECASE):
+        if match.group('start'):
+            break
+    else:
+        return None
+    # Follow nested elements with the same tag name to the one that closes this element
+    name = re.escape(re.match(r'<([\w-]+)', match.group('start')).group(1))
+    tags = re.compile(f'{OPAQUE_PATTERN}|<(?P<end>/?){name}\\b[^>]*?(?P<empty>/?)>', re.DOTALL | re.IGNORECASE)
+    depth = 0
+    for tag in tags.finditer(html, match.start()):
+        if tag.group('end') is None or tag.group('empty'):
+            continue
+        depth += -1 if tag.group('end') else 1
+        if depth == 0:
+            return html[match.start():tag.end()]
+    return html[match.start():]
+
+
+# Function to cut the FinViz news table out of a quote page, or None if the page has none
+def news_table_html(html):
+    return element_html(html, NEWS_TABLE_PATTERN)
+
+
+# Function to read the (date/time text, headline) of every row of the FinViz news table,
+# or None if the page has no news table
+def news_table_rows(html):
+    table = news_table_html(html)
+    if table is None:
+        return None
+    rows = []
+    for row in lxml.html.fragment_fromstring(table).iter('tr'):
+        cell = row.find('.//td')
+        link = row.find('.//a')
+        if cell is not None and link is not None:
+            rows.append((cell.text_content(), link.text_content()))
+    return rows
+
+
+# Function to turn news table rows into a DataFrame of Datetime and Headline. FinViz prints
+# the date only on the first row of each day, or "Today" for the current day; rows whose
+# date or time cannot be read are dropped.
+def parse_news_rows(rows, today=None):
+    news = pd.DataFrame(rows, columns=['When', 'Headline'], dtype=object)
+    parts = news['When'].str.split(expand=True).reindex(columns=[0, 1]).astype(object)
+    has_date = parts[1].notna()
+    dates = parts[0].where(has_date).replace('Today', (today or date.today()).strftime('%b-%d-%y')).ffill()
+    times = parts[1].where(has_date, parts[0])
+    news['Datetime'] = pd.to_datetime(dates + ' ' + times, format=NEWS_DATETIME_FORMAT, errors='coerce')
+    return news.loc[news['Datetime'].notna(), ['Datetime', 'Headline']].reset_index(drop=True)
+
+
+# Function to read the FinViz news of a quote page as a DataFrame of Datetime and Headline,
+# or None if the page has no news table
+def parse_news_page(html, today=None):
+    rows = news_table_rows(html)
+    return None if rows is None else parse_news_rows(rows, today)
+
+
+# Function to read the text of each named CSS selector from an AlphaSpread page, or None for
+# selectors that match nothing. With root_id, only the element with that id is parsed.
+def select_texts(html, selectors, root_id=None):
+    root = element_html(html, id_pattern(root_id)) if root_id else None
+    soup = BeautifulSoup(root if root is not None else html, 'html.parser')
+    texts = {name: soup.select_one(selector) for name, selector in selectors.items()}
+    if root is not None and any(text is None for text in texts.values()):
+        soup = BeautifulSoup(html, 'html.parser')
+        texts = {name: soup.select_one(selector) for name, selector in selectors.items()}
+    return {name: None if text is None else text.get_text() for name, text in texts.items()}
+
+
+# Function to read the values of one kind of AlphaSpread page ('summary', 'estimates' or 'dcf')
+def alphaspread_texts(html, page):
+    root_id, selectors = ALPHASPREAD_SELECTORS[page]
+    return select_texts(html, selectors, root_id)
@@ -0,0 +1,210 @@
+# Incremental Engle-Granger scan for a date window whose end moves forward.
+#
+# Every column of every pair's ADF regression is a fixed linear combination of the two
+# price series, their lagged differences and a constant, with weights given by the hedge
+# regression. The state saved on disk therefore only holds cross-product sums: the level
+# sums of the panel (for hedge ratios and correlations) and the Gram matrix of
+# [levels, lagged differences, 1] over all symbols (for the ADF regressions). Appending
+# rows updates these sums, and each pair's statistic is read back from them exactly,
+# without touching the price history again. A change to the start date, the symbol set or
+# already-seen prices forces a full rebuild.
+
+import hashlib
+import os
+
+import numpy as np
+
+from utils.cointegration import SQRTEPS, coint_pairs, mackinnon_pvalues, pair_indices
+
+STATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'cointegration')
+
+
+# Function to build the cache key for one universe, price field and start date
+def state_key(symbols, ohlc, start):
+    text = '|'.join([ohlc, str(start)] + list(symbols))
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+# Function to load a saved incremental state, or None if there is none
+def load_state(key):
+    path = os.path.join(STATE_DIR, f'{key}.npz')
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+# Function to save an incremental state atomically
+def save_state(key, state):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = os.path.join(STATE_DIR, f'{key}.npz')
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, **state)
+    os.replace(path + '.tmp', path)
+
+
+# Function to compute statsmodels' default ADF lag cap for a series of length nobs
+def default_maxlag(nobs):
+    return min(nobs // 2 - 1, int(np.ceil(12.0 * np.power(nobs / 100.0, 1 / 4.0))))
+
+
+# Function to build rows [levels, differences at lags 0..max_lag, 1] for difference rows start..stop-1
+def _design_rows(centred, start, stop, max_lag):
+    n = centred.shape[1]
+    diff = np.diff(centred, axis=0)
+    rows = np.zeros((stop - start, n * (max_lag + 2) + 1))
+    rows[:, :n] = centred[start:stop]
+    for j in range(max_lag + 1):
+        first = max(start, j)
+        rows[first - start:, n * (j + 1):n * (j + 2)] = diff[first - j:stop - j]
+    rows[:, -1] = 1.
+    return rows
+
+
+# Function to build a fresh state from a full price panel
+def full_state(prices, dates):
+    prices = np.asarray(prices, dtype=float)
+    n_rows = len(prices)
+    # Leave room for the ADF lag cap to grow while the window extends
+    max_lag = default_maxlag(2 * n_rows)
+
+    # Offsetting by the first row keeps the sums well conditioned
+    offset = prices[0].copy()
+    centred = prices - offset
+    head = _design_rows(centred, 0, max_lag, max_lag)
+    tail = _design_rows(centred, max_lag, n_rows - 1, max_lag)
+    return {
+        'dates': np.asarray(dates, dtype='datetime64[ns]'),
+        'offset': offset,
+        'max_lag': np.int64(max_lag),
+        'level_sums': centred.sum(axis=0),
+        'level_cross': centred.T @ centred,
+        'head': head,
+        'gram': tail.T @ tail,
+        'checksum': np.float64(centred.sum()),
+    }
+
+
+# Function to append new rows of prices to a state
+def update_state(state, prices, dates):
+    prices = np.asarray(prices, dtype=float)
+    n_old = len(state['dates'])
+    centred = prices - state['offset']
+    new_levels = centred[n_old:]
+    new_rows = _design_rows(centred, n_old - 1, len(prices) - 1, int(state['max_lag']))
+
+    state['dates'] = np.asarray(dates, dtype='datetime64[ns]')
+    state['level_sums'] = state['level_sums'] + new_levels.sum(axis=0)
+    state['level_cross'] = state['level_cross'] + new_levels.T @ new_levels
+    state['gram'] = state['gram'] + new_rows.T @ new_rows
+    state['checksum'] = np.float64(state['checksum'] + new_levels.sum())
+    return state
+
+
+# Function to check whether a saved state still describes the start of the current panel
+def _state_matches(state, prices, dates):
+    n = len(state['dates'])
+    if len(prices) < n or prices.shape[1] != len(state['offset']):
+        return False
+    if default_maxlag(len(prices)) > int(state['max_lag']):
+        return False
+    if not np.array_equal(np.asarray(dates[:n], dtype='datetime64[ns]'), state['dates']):
+        return False
+    # Re-adjusted history changes already-seen prices, which the running sums cannot undo
+    return np.isclose((prices[:n] - state['offset']).sum(), state['checksum'], rtol=1e-12, atol=1e-9)
+
+
+# Function to compute the hedge regression of left on [right, const] for all pairs from the level sums
+def _hedge_regressions(state, left, right):
+    n_rows = len(state['dates'])
+    mean = state['level_sums'] / n_rows
+    cov = state['level_cross'] / n_rows - np.outer(mean, mean)
+    beta = cov[left, right] / cov[right, right]
+    alpha = mean[left] - beta * mean[right]
+    correlation = cov[left, right] / np.sqrt(cov[left, left] * cov[right, right])
+    return beta, alpha, correlation
+
+
+# Function to read each pair's ADF cross products [level, lags 1..k, lag 0] for the sample
+# starting at difference row `start` out of the tail Gram matrix and the stored head rows
+def _pair_cross_products(state, start, left, right, beta, alpha, lags):
+    gram = state['gram']
+    n = len(state['offset'])
+
+    # Each virtual column is weight_a * left + weight_b * right + weight_c * const
+    blocks = np.concatenate([[0], np.arange(2, lags + 2), [1]])
+    index = np.stack([blocks[None, :] * n + left[:, None],
+                      blocks[None, :] * n + right[:, None],
+                      np.full((len(left), len(blocks)), gram.shape[0] - 1)], axis=-1)
+    weights = np.zeros(index.shape)
+    weights[..., 0] = 1.
+    weights[..., 1] = -beta[:, None]
+    weights[:, 0, 2] = -alpha
+
+    cross = np.zeros((len(left), len(blocks), len(blocks)))
+    for a in range(3):
+        for b in range(3):
+            cross += (weights[:, :, None, a] * weights[:, None, :, b]
+                      * gram[index[:, :, None, a], index[:, None, :, b]])
+
+    # Rows before the tail are few, so build their virtual columns directly
+    head = state['head'][start:]
+    if len(head):
+        columns = (head[:, index] * weights[None]).sum(axis=-1)
+        cross += np.einsum('tpc,tpd->pcd', columns, columns)
+    return cross
+
+
+# Function to compute Engle-Granger statistics for all pairs from a state
+def state_statistics(state, left, right):
+    n_diffs = len(state['dates']) - 1
+    maxlag = default_maxlag(len(state['dates']))
+    beta, alpha, correlation = _hedge_regressions(state, left, right)
+    stats = np.full(len(left), -np.inf)
+    valid = np.flatnonzero(correlation * correlation < 1 - 100 * SQRTEPS)
+
+    # AIC lag search on the common sample, as in statsmodels' adfuller
+    cross = _pair_cross_products(state, maxlag, left[valid], right[valid], beta[valid], alpha[valid], maxlag)
+    nobs = n_diffs - maxlag
+    chol = np.linalg.cholesky(cross[:, :-1, :-1])
+    z = np.linalg.solve(chol, cross[:, :-1, -1:])[..., 0]
+    ssr = np.maximum(cross[:, -1, -1][:, None] - np.cumsum(z * z, axis=1), np.finfo(np.double).tiny)
+    aic = nobs * (np.log(2 * np.pi) + np.log(ssr / nobs) + 1) + 2 * np.arange(1, maxlag + 2)
+    best_lags = np.argmin(aic, axis=1)
+
+    # Final regression per lag length on its own sample
+    for lags in np.unique(best_lags):
+        group = valid[best_lags == lags]
+        cross = _pair_cross_products(state, lags, left[group], right[group], beta[group], alpha[group], lags)
+        nobs = n_diffs - lags
+        gram_inv = np.linalg.inv(cross[:, :-1, :-1])
+        params = np.matmul(gram_inv, cross[:, :-1, -1:])[..., 0]
+        ssr = cross[:, -1, -1] - (params * cross[:, :-1, -1]).sum(axis=1)
+        sigma2 = np.maximum(ssr, 0) / (nobs - lags - 1)
+        stats[group] = params[:, 0] / np.sqrt(sigma2 * gram_inv[:, 0, 0])
+    return stats, correlation
+
+
+# Function to return (pvalues, correlations, new rows) for all pairs, reusing the saved state
+def incremental_coint(prices, dates, key):
+    prices = np.asarray(prices, dtype=float)
+    left, right = pair_indices(prices.shape[1])
+
+    # Too short to hold a sample of lagged differences, so just test directly
+    if len(prices) <= 2 * default_maxlag(2 * len(prices)) + 2:
+        _, pvalues, correlations = coint_pairs(prices, left, right)
+        return pvalues, correlations, len(prices)
+
+    state = load_state(key)
+    if state is None or not _state_matches(state, prices, dates):
+        state = full_state(prices, dates)
+        new_rows = len(prices)
+    else:
+        new_rows = len(prices) - len(state['dates'])
+        if new_rows:
+            state = update_state(state, prices, dates)
+    if new_rows:
+        save_state(key, state)
+
+    stats, correlations = state_statistics(state, left, right)
+    return mackinnon_pvalues(stats), correlations, new_rows
@@ -0,0 +1,115 @@
+# Streaming RSI, moving average and Bollinger Band engine.
+#
+# A close history is processed once to produce the indicator columns and a small state:
+# Wilder's running gain/loss averages for RSI, and the last `window` closes with their
+# running sums for the moving average and bands. Each appended bar then updates the state
+# in O(1) without touching the history, so a live view can tick on intraday bars. Steps
+# return a new state instead of changing the old one, which lets a still-forming bar be
+# evaluated provisionally and replaced on the next tick.
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['RSI', 'MA20', 'UpperBand', 'LowerBand']
+
+
+# Function to compute the indicator columns for a close series and the state after its last bar
+def indicator_frame(closes, rsi_window=14, band_window=20, num_std=2):
+    closes = pd.Series(closes, dtype=float)
+    values = closes.to_numpy()
+
+    # Wilder's RSI as in ta.momentum.RSIIndicator: the first bar counts as a zero move
+    diff = closes.diff()
+    ema_up = diff.where(diff > 0, 0.0).ewm(alpha=1 / rsi_window, min_periods=rsi_window, adjust=False).mean()
+    ema_down = (-diff.where(diff < 0, 0.0)).ewm(alpha=1 / rsi_window, min_periods=rsi_window, adjust=False).mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = (100 - 100 / (1 + ema_up / ema_down)).mask(ema_down == 0, 100)
+
+    # One rolling mean and one rolling std shared by both bands
+    rolling = closes.rolling(window=band_window)
+    ma = rolling.mean()
+    band = num_std * rolling.std()
+    frame = pd.DataFrame({'RSI': rsi, 'MA20': ma, 'UpperBand': ma + band, 'LowerBand': ma - band})
+
+    # Running sums are kept relative to a fixed shift so they stay well conditioned
+    window = values[-band_window:]
+    shift = window[0] if len(window) else 0.
+    alpha = 1 / rsi_window
+    state = {
+        'rsi_window': rsi_window,
+        'band_window': band_window,
+        'num_std': num_std,
+        'count': len(values),
+        'last_close': values[-1] if len(values) else np.nan,
+        'avg_up': _ewm_last(diff.where(diff > 0, 0.0), alpha),
+        'avg_down': _ewm_last(-diff.where(diff < 0, 0.0), alpha),
+        'window': window.copy(),
+        'shift': shift,
+        'sum': (window - shift).sum(),
+        'sum_sq': ((window - shift) ** 2).sum(),
+    }
+    return frame, state
+
+
+# Function to get the last value of an adjust=False EWM, ignoring min_periods
+def _ewm_last(series, alpha):
+    if not len(series):
+        return 0.
+    return series.ewm(alpha=alpha, adjust=False).mean().iat[-1]
+
+
+# Function to add one bar to a state, returning the new state and the bar's indicator values
+def step_indicators(state, close):
+    rsi_window = state['rsi_window']
+    band_window = state['band_window']
+    count = state['count'] + 1
+
+    # Wilder's smoothing of gains and losses
+    move = close - state['last_close'] if state['count'] else 0.
+    alpha = 1 / rsi_window
+    if state['count']:
+        avg_up = (1 - alpha) * state['avg_up'] + alpha * max(move, 0.)
+        avg_down = (1 - alpha) * state['avg_down'] + alpha * max(-move, 0.)
+    else:
+        avg_up = avg_down = 0.
+    if count < rsi_window:
+        rsi = np.nan
+    elif avg_down == 0:
+        rsi = 100.
+    else:
+        rsi = 100 - 100 / (1 + avg_up / avg_down)
+
+    # Slide the band window: add the new close and drop the oldest once it is full
+    window = state['window']
+    shift = state['shift'] if len(window) else close
+    total = state['sum'] + (close - shift)
+    total_sq = state['sum_sq'] + (close - shift) ** 2
+    if len(window) == band_window:
+        total -= window[0] - shift
+        total_sq -= (window[0] - shift) ** 2
+        window = np.append(window[1:], close)
+    else:
+        window = np.append(window, close)
+
+    if len(window) < band_window:
+        ma = upper = lower = np.nan
+    else:
+        mean = total / band_window
+        std = np.sqrt(max(total_sq - total * mean, 0.) / (band_window - 1))
+        ma = mean + shift
+        upper = ma + state['num_std'] * std
+        lower = ma - state['num_std'] * std
+
+    new_state = dict(state, count=count, last_close=close, avg_up=avg_up, avg_down=avg_down, window=window,
+                     shift=shift, sum=total, sum_sq=total_sq)
+    return new_state, {'RSI': rsi, 'MA20': ma, 'UpperBand': upper, 'LowerBand': lower}
+
+
+# Function to append bars to an indicator frame, updating only the new rows
+def append_indicators(frame, state, closes):
+    rows = []
+    for close in np.asarray(closes, dtype=float):
+        state, values = step_indicators(state, close)
+        rows.append(values)
+    new_rows = pd.DataFrame(rows, columns=COLUMNS, index=closes.index if hasattr(closes, 'index') else None)
+    return pd.concat([frame, new_rows]) if len(frame) else new_rows, state
@@ -0,0 +1,76 @@
+# Closed-form Kalman filters for the pairs trading models.
+#
+# Both filters follow filterpy's predict/update steps (including the Joseph form covariance
+# update) but write the 1-D and 2-D recursions out by hand over preallocated arrays.
+# Passing a 2-D array filters every column at once.
+
+import numpy as np
+
+
+# Function to smooth one or many price series with a random-walk Kalman filter
+def kalman_average(x, observation_covariance=5., transition_covariance=0.1, initial_covariance=1000.):
+    z = np.asarray(x, dtype=float)
+    means = np.empty_like(z)
+
+    # The covariance recursion does not depend on the data, so the gains are shared by all columns
+    gains = np.empty(z.shape[0])
+    p = initial_covariance
+    for t in range(z.shape[0]):
+        p += transition_covariance
+        k = p / (p + observation_covariance)
+        p = (1. - k) * (1. - k) * p + k * k * observation_covariance
+        gains[t] = k
+
+    state = np.zeros(z.shape[1:])
+    for t in range(z.shape[0]):
+        state = state + gains[t] * (z[t] - state)
+        means[t] = state
+    return means
+
+
+# Function to track a time-varying hedge ratio and intercept of y on x for one or many pairs
+def kalman_regression(x, y, delta=1e-3, observation_covariance=5., initial_covariance=1000.):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    means = np.empty(x.shape + (2,))
+
+    # State is [slope, intercept], covariance is stored as its three distinct entries
+    slope = np.zeros(x.shape[1:])
+    intercept = np.zeros(x.shape[1:])
+    p00 = np.full(x.shape[1:], initial_covariance)
+    p01 = np.zeros(x.shape[1:])
+    p11 = np.full(x.shape[1:], initial_covariance)
+
+    for t in range(x.shape[0]):
+        h = x[t]
+
+        # Predict: identity transition, so only the covariance grows
+        p00 = p00 + delta
+        p11 = p11 + delta
+
+        # Update with the observation y[t] = h * slope + intercept
+        ph0 = p00 * h + p01
+        ph1 = p01 * h + p11
+        s = h * ph0 + ph1 + observation_covariance
+        k0 = ph0 / s
+        k1 = ph1 / s
+        error = y[t] - (h * slope + intercept)
+        slope = slope + k0 * error
+        intercept = intercept + k1 * error
+
+        # Joseph form: P = (I - KH) P (I - KH)' + K R K'
+        a00 = 1. - k0 * h
+        a01 = -k0
+        a10 = -k1 * h
+        a11 = 1. - k1
+        ap00 = a00 * p00 + a01 * p01
+        ap01 = a00 * p01 + a01 * p11
+        ap10 = a10 * p00 + a11 * p01
+        ap11 = a10 * p01 + a11 * p11
+        p00, p01, p11 = (ap00 * a00 + ap01 * a01 + observation_covariance * k0 * k0,
+                         ap00 * a10 + ap01 * a11 + observation_covariance * k0 * k1,
+                         ap10 * a10 + ap11 * a11 + observation_covariance * k1 * k1)
+
+        means[t, ..., 0] = slope
+        means[t, ..., 1] = intercept
+    return means
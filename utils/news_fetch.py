@@ -0,0 +1,166 @@
+# Concurrent FinViz quote page fetching for many tickers.
+#
+# All pages of a batch go through one aiohttp session, so connections to a host are pooled
+# and reused. Requests per host are capped by a semaphore and spaced by a rate limiter, and
+# failed or throttled requests are retried with exponential backoff. The last page of every
+# ticker is kept on disk with its ETag/Last-Modified validators and sent back as a
+# conditional request, so an unchanged page costs a 304 instead of a full download.
+# FINVIZ_URL can point the fetcher at a local stand-in server (see benchmarks/finviz_server.py).
+
+import asyncio
+import json
+import os
+import random
+from urllib.parse import urlsplit
+
+import aiohttp
+
+FINVIZ_URL = os.environ.get('FINVIZ_URL', 'https://finviz.com/quote.ashx?t=')
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'news')
+
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+# Politeness limits per host
+MAX_PER_HOST = 8
+REQUESTS_PER_SECOND = 10.0
+
+# Retries after the first attempt, backoff base in seconds and total time per request
+RETRIES = 3
+BACKOFF_SECONDS = 0.5
+TIMEOUT_SECONDS = 15
+
+# Longest Retry-After to wait for, the longest backoff; a ticker asked to wait longer fails
+MAX_RETRY_AFTER_SECONDS = BACKOFF_SECONDS * 2 ** RETRIES
+
+# Responses worth retrying: throttling and server-side failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+# Function to build the file paths of one ticker's cached page and its validators
+def _page_paths(ticker):
+    name = ticker.replace('/', '_')
+    return os.path.join(CACHE_DIR, f'{name}.html'), os.path.join(CACHE_DIR, f'{name}.json')
+
+
+# Function to load a ticker's cached page and validators, or (None, {}) if there is none
+def load_cached_page(ticker):
+    page_path, validators_path = _page_paths(ticker)
+    if not (os.path.exists(page_path) and os.path.exists(validators_path)):
+        return None, {}
+    with open(page_path, encoding='utf-8') as f:
+        page = f.read()
+    with open(validators_path) as f:
+        return page, json.load(f)
+
+
+# Function to store a page and its validators atomically
+def save_cached_page(ticker, page, validators):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    page_path, validators_path = _page_paths(ticker)
+    with open(page_path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(page)
+    with open(validators_path + '.tmp', 'w') as f:
+        json.dump(validators, f)
+    os.replace(page_path + '.tmp', page_path)
+    os.replace(validators_path + '.tmp', validators_path)
+
+
+# Function to create the per-host limits: a concurrency semaphore and a rate limiter state
+def host_limits(max_per_host=MAX_PER_HOST, requests_per_second=REQUESTS_PER_SECOND):
+    return {
+        'semaphore': asyncio.Semaphore(max_per_host),
+        'lock': asyncio.Lock(),
+        'interval': 1 / requests_per_second if requests_per_second else 0.,
+        'next': 0.,
+    }
+
+
+# Function to wait until the rate limiter lets the next request of a host start
+async def wait_turn(limits):
+    loop = asyncio.get_running_loop()
+    async with limits['lock']:
+        now = loop.time()
+        start = max(now, limits['next'])
+        limits['next'] = start + limits['interval']
+    await asyncio.sleep(start - now)
+
+
+# Function to pick the wait before a retry, honouring a numeric Retry-After header
+def _retry_delay(attempt, retry_after=None):
+    if retry_after is not None and retry_after.isdigit():
+        return float(retry_after)
+    # Exponential backoff with jitter so retries of many tickers do not arrive together
+    return BACKOFF_SECONDS * 2 ** attempt * (0.5 + random.random())
+
+
+# Function to fetch one page with conditional headers, retries and the host's limits.
+# Returns the page text, from the cache when the server answers 304 Not Modified.
+async def fetch_page(session, url, ticker, limits, retries=RETRIES):
+    cached, validators = load_cached_page(ticker)
+    headers = {}
+    if cached is not None and validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if cached is not None and validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+
+    error = None
+    for attempt in range(retries + 1):
+        retry_after = None
+        try:
+            async with limits['semaphore']:
+                await wait_turn(limits)
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304 and cached is not None:
+                        return cached
+                    if response.status == 200:
+                        page = await response.text()
+                        save_cached_page(ticker, page, {'etag': response.headers.get('ETag'),
+                                                        'last_modified': response.headers.get('Last-Modified')})
+                        return page
+                    error = f'HTTP {response.status}'
+                    if response.status not in RETRY_STATUSES:
+                        break
+                    retry_after = response.headers.get('Retry-After')
+                    if retry_after is not None and retry_after.isdigit() and \
+                            float(retry_after) > MAX_RETRY_AFTER_SECONDS:
+                        error += f' (Retry-After {retry_after} s)'
+                        break
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = f'{type(e).__name__}: {e}'
+        if attempt < retries:
+            await asyncio.sleep(_retry_delay(attempt, retry_after))
+    raise RuntimeError(f'{ticker}: {error}')
+
+
+# Function to fetch the pages of all tickers concurrently in one pooled session
+async def _fetch_all(tickers, base_url, max_per_host, requests_per_second, retries):
+    limits = {}
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT_SECONDS)
+    connector = aiohttp.TCPConnector(limit_per_host=max_per_host)
+    async with aiohttp.ClientSession(headers=HEADERS, timeout=timeout, connector=connector) as session:
+        tasks = []
+        for ticker in tickers:
+            url = base_url + ticker
+            host = urlsplit(url).netloc
+            if host not in limits:
+                limits[host] = host_limits(max_per_host, requests_per_second)
+            tasks.append(fetch_page(session, url, ticker, limits[host], retries))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    pages, failures = {}, {}
+    for ticker, result in zip(tickers, results):
+        if isinstance(result, Exception):
+            failures[ticker] = str(result)
+        else:
+            pages[ticker] = result
+    return pages, failures
+
+
+# Function to fetch the FinViz quote pages of many tickers, returning ({ticker: html}, {ticker: error})
+def fetch_news_pages(tickers, base_url=None, max_per_host=MAX_PER_HOST, requests_per_second=REQUESTS_PER_SECOND,
+                     retries=RETRIES):
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return {}, {}
+    return asyncio.run(_fetch_all(tickers, base_url or FINVIZ_URL, max_per_host, requests_per_second, retries))
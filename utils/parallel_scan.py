@@ -0,0 +1,70 @@
+# Process-pool pair scanning over a price panel held in shared memory.
+#
+# The pair index space is cut into contiguous chunks of (left, right) indices.
+# Workers attach to one shared copy of the panel, run the batched Engle-Granger test on
+# their chunk and send back only the small result arrays, which are yielded as they finish.
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+from utils.cointegration import coint_pairs, pair_indices
+
+# Panel attached by each worker process
+_worker_panel = None
+_worker_shm = None
+
+
+# Function to attach a worker to the shared price panel
+def _attach_panel(name, shape, dtype):
+    global _worker_panel, _worker_shm
+    _worker_shm = shared_memory.SharedMemory(name=name)
+    _worker_panel = np.ndarray(shape, dtype=dtype, buffer=_worker_shm.buf)
+
+
+# Function to test one chunk of pairs
+def _scan_chunk(left, right):
+    _, pvalues, correlations = coint_pairs(_worker_panel, left, right)
+    return left, right, pvalues, correlations
+
+
+# Function to copy a price panel into a new shared memory block
+def share_panel(prices):
+    prices = np.ascontiguousarray(prices, dtype=float)
+    shm = shared_memory.SharedMemory(create=True, size=max(prices.nbytes, 1))
+    panel = np.ndarray(prices.shape, dtype=prices.dtype, buffer=shm.buf)
+    panel[:] = prices
+    return shm, panel
+
+
+# Function to scan pairs in parallel, yielding (left, right, pvalues, correlations) per chunk.
+# By default all pairs of the upper triangle are scanned.
+def scan_pairs_parallel(prices, left=None, right=None, chunk_size=256, max_workers=None):
+    if left is None:
+        left, right = pair_indices(np.shape(prices)[1])
+    n_pairs = len(left)
+    if n_pairs == 0:
+        return
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    shm, panel = share_panel(prices)
+    try:
+        # Spawn fresh workers instead of forking the multi-threaded Streamlit server
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context('spawn'),
+                                 initializer=_attach_panel,
+                                 initargs=(shm.name, panel.shape, panel.dtype)) as executor:
+            futures = [executor.submit(_scan_chunk, left[start:start + chunk_size], right[start:start + chunk_size])
+                       for start in range(0, n_pairs, chunk_size)]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+    finally:
+        del panel
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,45 @@
+# Cheap pre-filter that prunes the pair search before the cointegration tests.
+#
+# The full correlation matrix is one vectorized call. Pairs can then be restricted to those
+# above a correlation floor and/or to symbols in the same hierarchical cluster of the
+# correlation distance 1 - rho.
+
+import time
+
+import numpy as np
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import squareform
+
+from utils.cointegration import pair_indices
+
+
+# Function to cluster symbols on the correlation distance 1 - rho
+def correlation_clusters(correlation, n_clusters):
+    distance = np.clip(1 - correlation, 0, 2)
+    np.fill_diagonal(distance, 0)
+    tree = linkage(squareform(distance, checks=False), method='average')
+    return fcluster(tree, t=n_clusters, criterion='maxclust')
+
+
+# Function to select candidate pairs and report how much of the search was pruned
+def candidate_pairs(prices, min_correlation=None, n_clusters=None):
+    started = time.perf_counter()
+    prices = np.asarray(prices, dtype=float)
+    n = prices.shape[1]
+    correlation = np.corrcoef(prices, rowvar=False)
+    left, right = pair_indices(n)
+
+    keep = np.ones(len(left), dtype=bool)
+    if min_correlation is not None:
+        keep &= correlation[left, right] >= min_correlation
+    if n_clusters is not None and n > 1:
+        labels = correlation_clusters(correlation, n_clusters)
+        keep &= labels[left] == labels[right]
+
+    stats = {
+        'total_pairs': len(left),
+        'candidate_pairs': int(keep.sum()),
+        'pruned_fraction': 1 - keep.sum() / len(left) if len(left) else 0.0,
+        'seconds': time.perf_counter() - started,
+    }
+    return left[keep], right[keep], correlation, stats
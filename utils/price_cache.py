@@ -0,0 +1,130 @@
+# On-disk price panel cache in front of yfinance.
+#
+# Each price field (e.g. 'Adj Close') is stored as one Parquet file with dates as the
+# index and symbols as columns, next to a JSON file recording which date range has been
+# fetched for every symbol. Requests only download the symbols and date ranges that are
+# missing, and all missing symbols that share a range are fetched in one threaded call.
+
+import json
+import os
+import threading
+from datetime import date, timedelta
+
+import pandas as pd
+import yfinance as yf
+from yfinance import shared
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'prices')
+
+# Days of overlap when extending a cached series, used to detect re-adjusted prices
+OVERLAP_DAYS = 7
+
+# yfinance reports per-symbol errors through a module-level dict, so downloads are serialised
+_lock = threading.Lock()
+
+
+# Function to build the file paths for one price field
+def _field_paths(field):
+    name = field.lower().replace(' ', '_')
+    return os.path.join(CACHE_DIR, f'{name}.parquet'), os.path.join(CACHE_DIR, f'{name}.json')
+
+
+# Function to load the cached panel and per-symbol coverage for one price field
+def load_panel(field):
+    panel_path, coverage_path = _field_paths(field)
+    if not (os.path.exists(panel_path) and os.path.exists(coverage_path)):
+        return pd.DataFrame(index=pd.DatetimeIndex([]), dtype=float), {}
+    panel = pd.read_parquet(panel_path)
+    with open(coverage_path) as f:
+        coverage = {symbol: (date.fromisoformat(start), date.fromisoformat(end))
+                    for symbol, (start, end) in json.load(f).items()}
+    return panel, coverage
+
+
+# Function to write the panel and coverage atomically so concurrent readers never see half a file
+def save_panel(field, panel, coverage):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    panel_path, coverage_path = _field_paths(field)
+    panel.sort_index().to_parquet(panel_path + '.tmp')
+    with open(coverage_path + '.tmp', 'w') as f:
+        json.dump({symbol: [start.isoformat(), end.isoformat()] for symbol, (start, end) in coverage.items()}, f)
+    os.replace(panel_path + '.tmp', panel_path)
+    os.replace(coverage_path + '.tmp', coverage_path)
+
+
+# Function to group symbols by the date range that still has to be downloaded
+def missing_ranges(coverage, symbols, start, end):
+    ranges = {}
+    for symbol in symbols:
+        if symbol not in coverage:
+            ranges.setdefault((start, end), []).append(symbol)
+            continue
+        cached_start, cached_end = coverage[symbol]
+        if start < cached_start:
+            ranges.setdefault((start, cached_start + timedelta(days=OVERLAP_DAYS)), []).append(symbol)
+        if end > cached_end:
+            ranges.setdefault((cached_end - timedelta(days=OVERLAP_DAYS), end), []).append(symbol)
+    return ranges
+
+
+# Function to download one price field for many symbols in a single threaded request
+def download_panel(symbols, field, start, end):
+    data = yf.download(symbols, start=start, end=end, group_by='column', threads=True, progress=False)
+    errors = {symbol: shared._ERRORS[symbol] for symbol in symbols if symbol in shared._ERRORS}
+    if data.empty or field not in data.columns.get_level_values(0):
+        return pd.DataFrame(dtype=float), errors
+    if not isinstance(data.columns, pd.MultiIndex):
+        panel = data[[field]].set_axis(symbols, axis=1)
+    else:
+        panel = data[field]
+    panel.index = pd.to_datetime(panel.index).tz_localize(None)
+    return panel.astype(float), errors
+
+
+# Function to check whether freshly downloaded prices agree with the cached ones where they overlap
+def _matches_cache(cached, fetched):
+    both = pd.concat([cached, fetched], axis=1, join='inner').dropna()
+    if both.empty:
+        return True
+    return ((both.iloc[:, 0] - both.iloc[:, 1]).abs() <= 1e-6 * both.iloc[:, 0].abs()).all()
+
+
+# Function to return a (dates x symbols) panel for the requested window, downloading only what is missing
+def get_price_panel(symbols, field, start, end):
+    start = pd.Timestamp(start).date()
+    end = pd.Timestamp(end).date()
+    # Never mark days that have not closed yet as cached
+    covered_end = min(end, date.today())
+    failures = {}
+
+    with _lock:
+        panel, coverage = load_panel(field)
+        updates = {}
+        pending = missing_ranges(coverage, symbols, start, end)
+        while pending:
+            (fetch_start, fetch_end), batch = pending.popitem()
+            fetched, errors = download_panel(batch, field, fetch_start, fetch_end)
+            failures.update(errors)
+            for symbol in batch:
+                if symbol in errors or symbol not in fetched.columns:
+                    continue
+                series = fetched[symbol].dropna()
+                if symbol in coverage:
+                    cached = updates[symbol] if symbol in updates else panel.get(symbol, pd.Series(dtype=float))
+                    # Dividends and splits re-adjust history, so refetch the whole range on a mismatch
+                    if not _matches_cache(cached.dropna(), series):
+                        cached_start, cached_end = coverage.pop(symbol)
+                        pending.setdefault((min(start, cached_start), max(end, cached_end)), []).append(symbol)
+                        continue
+                    series = series.combine_first(cached.dropna())
+                updates[symbol] = series
+                cached_start, cached_end = coverage.get(symbol, (start, covered_end))
+                coverage[symbol] = (min(cached_start, fetch_start), max(cached_end, min(fetch_end, covered_end)))
+        if updates:
+            panel = panel.drop(columns=list(updates), errors='ignore')
+            panel = panel.join(pd.DataFrame(updates), how='outer') if not panel.empty else pd.DataFrame(updates)
+            save_panel(field, panel, coverage)
+
+    window = panel.reindex(columns=[symbol for symbol in symbols if symbol in coverage])
+    window = window[(window.index >= pd.Timestamp(start)) & (window.index < pd.Timestamp(end))]
+    return window, failures
@@ -0,0 +1,63 @@
+# Persistent process pools shared by all reruns of the app in one server process.
+#
+# Each kind of work gets its own named pool of spawned workers, started on first use with
+# one worker per CPU and an optional initializer that loads what the workers need once.
+# Calls are run with a cap on how many are in flight, so callers can use fewer workers
+# than the pool has. A pool whose worker crashed is forgotten and started again next time.
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+# Pools by name
+_pools = {}
+
+
+# Function to get a named pool, starting it on first use. Workers are only started as calls
+# need them, up to one per CPU.
+def get_pool(name, initializer=None):
+    if name not in _pools:
+        # Spawn fresh workers instead of forking the multi-threaded Streamlit server
+        _pools[name] = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=get_context('spawn'),
+                                           initializer=initializer)
+    return _pools[name]
+
+
+# Function to forget a named pool whose worker crashed, so the next call starts a new one
+def reset_pool(name):
+    _pools.pop(name, None)
+
+
+# Function to stop a named pool's workers and forget it
+def shutdown_pool(name):
+    pool = _pools.pop(name, None)
+    if pool is not None:
+        pool.shutdown()
+
+
+# Function to run calls in a named pool with at most max_workers of them in flight at once.
+# calls maps a name to (function, *args); yields (name, result) in the order the calls finish.
+def run_limited(pool_name, calls, max_workers, initializer=None):
+    pool = get_pool(pool_name, initializer)
+    pending = iter(calls.items())
+    running = {}
+    try:
+        while True:
+            # Keep up to max_workers calls submitted; the others wait here, not in the pool's queue
+            for name, (function, *args) in pending:
+                running[pool.submit(function, *args)] = name
+                if len(running) >= max_workers:
+                    break
+            if not running:
+                return
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield running.pop(future), future.result()
+    except BrokenProcessPool:
+        # A crashed worker breaks the whole pool, so start a new one on the next run
+        reset_pool(pool_name)
+        raise
+    finally:
+        for future in running:
+            future.cancel()
@@ -0,0 +1,186 @@
+# On-disk cache of fitted Prophet models.
+#
+# A fitted model is stored in Prophet's own JSON serialization, keyed by the ticker, a hash
+# of the training window and the Prophet parameters, next to a small metadata file that
+# lets later fits find it. Training on an unchanged window loads the model instead of
+# fitting it. When a window has only grown by a few new rows since it was last fitted, the
+# new fit can start from the cached cold fit's parameters, which converges in far fewer
+# iterations than a cold start. The optimizer then stops at a slightly different point: on
+# ten years of daily closes around 100, yhat differs from a cold fit on the same window by
+# up to about 1-2, about as much as a looser stopping tolerance moves a cold fit. Callers
+# whose windows are not one series growing over time, like cross-validation cutoffs, turn
+# warm starts off and only get cold fits, so their results do not depend on what the cache
+# already holds.
+# Component charts are built in Plotly only when asked for and stored next to their model.
+# The cache is kept under a size budget by removing the least recently used models.
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import plotly.io as pio
+from prophet import Prophet
+from prophet.plot import plot_components_plotly
+from prophet.serialize import model_from_json, model_to_json
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'prophet')
+
+# Size budget of the model files, about 150 daily models of ten years each
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+# Rows a window may have grown by and still warm-start from a cached fit
+WARM_START_ROWS = 30
+
+
+# Function to hash a training window of ds/y rows
+def history_hash(history):
+    digest = hashlib.sha1(np.ascontiguousarray(history['ds'].values.astype('datetime64[ns]').view('int64')).tobytes())
+    digest.update(np.ascontiguousarray(history['y'].to_numpy(dtype=float)).tobytes())
+    return digest.hexdigest()
+
+
+# Function to hash the Prophet constructor parameters
+def params_hash(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# Function to build the cache key of a training window and Prophet parameters
+def model_key(history, params=None):
+    return hashlib.sha1(f'{history_hash(history)}{params_hash(params or {})}'.encode()).hexdigest()
+
+
+# Function to build the file paths of one cached model and its metadata
+def _model_paths(ticker, key):
+    name = f'{ticker.replace("/", "_")}-{key}'
+    return os.path.join(CACHE_DIR, f'{name}.json'), os.path.join(CACHE_DIR, f'{name}.meta.json')
+
+
+# Function to check whether a cache file is a model rather than one of its companion files
+def _is_model_file(name):
+    return name.endswith('.json') and not name.endswith('.meta.json') and '.components-' not in name
+
+
+# Function to write a file atomically so concurrent readers never see half a model
+def _write_atomic(path, text):
+    with open(path + '.tmp', 'w') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)
+
+
+# Function to load a cached model, or None if there is none. With cold_only, a model that was
+# warm-started counts as missing.
+def load_model(ticker, key, cold_only=False):
+    model_path, meta_path = _model_paths(ticker, key)
+    if not (os.path.exists(model_path) and os.path.exists(meta_path)):
+        return None
+    if cold_only:
+        with open(meta_path) as f:
+            if json.load(f)['warm_start']:
+                return None
+    with open(model_path) as f:
+        model = model_from_json(f.read())
+    # Mark the model as recently used for eviction
+    os.utime(model_path)
+    return model
+
+
+# Function to store a fitted model with the metadata needed to warm-start from it
+def save_model(ticker, key, model, meta):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    model_path, meta_path = _model_paths(ticker, key)
+    _write_atomic(model_path, model_to_json(model))
+    _write_atomic(meta_path, json.dumps(meta))
+    evict(keep=model_path)
+
+
+# Function to remove the least recently used models until the cache fits its size budget
+def evict(max_bytes=MAX_CACHE_BYTES, keep=None):
+    if not os.path.isdir(CACHE_DIR):
+        return
+    names = os.listdir(CACHE_DIR)
+    models = []
+    for name in names:
+        if _is_model_file(name):
+            # A model is evicted together with its metadata and component charts
+            path = os.path.join(CACHE_DIR, name)
+            stem = name[:-len('.json')]
+            files = [os.path.join(CACHE_DIR, other) for other in names
+                     if other == name or other.startswith(f'{stem}.') and other.endswith('.json')]
+            models.append((os.path.getmtime(path), sum(os.path.getsize(other) for other in files), path, files))
+    total = sum(size for _, size, _, _ in models)
+    for _, size, path, files in sorted(models):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        for stale in files:
+            if os.path.exists(stale):
+                os.remove(stale)
+        total -= size
+
+
+# Function to find a cached cold fit of an earlier, shorter version of the same window. Returns
+# its fitted parameters as Stan initial values, or None if there is no such fit.
+def warm_start_params(ticker, history, params_key):
+    if not os.path.isdir(CACHE_DIR):
+        return None
+    best = None
+    prefix = f'{ticker.replace("/", "_")}-'
+    for name in os.listdir(CACHE_DIR):
+        if not (name.startswith(prefix) and name.endswith('.meta.json')):
+            continue
+        with open(os.path.join(CACHE_DIR, name)) as f:
+            meta = json.load(f)
+        grown = len(history) - meta['n_rows']
+        # Only start from cold fits, so warm starts never build on one another
+        if meta['params'] != params_key or meta['warm_start'] or not 0 < grown <= WARM_START_ROWS:
+            continue
+        # The cached window must be exactly the start of the new one
+        if (best is None or meta['n_rows'] > best['n_rows']) and \
+                history_hash(history.iloc[:meta['n_rows']]) == meta['history']:
+            best = meta
+    if best is None:
+        return None
+    model = load_model(ticker, best['key'])
+    if model is None:
+        return None
+    return {name: float(value[0][0]) if name in ('k', 'm', 'sigma_obs') else np.asarray(value[0])
+            for name, value in model.params.items() if name in ('k', 'm', 'sigma_obs', 'delta', 'beta')}
+
+
+# Function to return a fitted Prophet model for a ticker's ds/y training window, loading it from
+# the cache when the window and parameters are unchanged and, with warm_start, warm-starting
+# when it has grown
+def fit_prophet(ticker, history, warm_start=True, **params):
+    history = history.reset_index(drop=True)
+    history_key = history_hash(history)
+    params_key = params_hash(params)
+    key = model_key(history, params)
+    model = load_model(ticker, key, cold_only=not warm_start)
+    if model is not None:
+        return model
+
+    model = Prophet(**params)
+    init = warm_start_params(ticker, history, params_key) if warm_start else None
+    if init is not None:
+        model.fit(history, init=init)
+    else:
+        model.fit(history)
+    save_model(ticker, key, model, {'key': key, 'params': params_key, 'history': history_key,
+                                    'n_rows': len(history), 'warm_start': init is not None})
+    return model
+
+
+# Function to return the Plotly component chart of a model's forecast, cached next to the model.
+# The chart is only built the first time it is asked for.
+def component_figure(ticker, history, model, forecast, params=None):
+    model_path, _ = _model_paths(ticker, model_key(history.reset_index(drop=True), params))
+    path = f'{model_path[:-len(".json")]}.components-{len(forecast)}.json'
+    if os.path.exists(path):
+        with open(path) as f:
+            return pio.from_json(f.read())
+    fig = plot_components_plotly(model, forecast)
+    if os.path.exists(model_path):
+        _write_atomic(path, fig.to_json())
+    return fig
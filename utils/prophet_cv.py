@@ -0,0 +1,93 @@
+# Rolling-origin cross-validation of Prophet forecasts.
+#
+# The history is cut at many cutoff dates; for each cutoff a model is fitted on the closes
+# up to it and scored on the following horizon. Cutoffs lie on a fixed calendar grid, so on
+# the next day the same training windows come back and their fits load from the model
+# cache. Cutoffs are fitted in the shared process pool, always cold so the scores do not
+# depend on the order the fits finish in, and each worker only predicts the test rows, not
+# the whole training history. Errors are then summarised by horizon.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.process_pool import run_limited
+from utils.prophet_cache import fit_prophet
+from utils.prophet_pool import POOL_NAME
+
+# Days of horizon per row of the metrics table
+HORIZON_BIN_DAYS = 7
+
+
+# Function to pick up to n_cutoffs cutoff dates, evenly spaced on a calendar grid that does not
+# move as the history grows, each with at least initial_days of training and a full horizon after it
+def rolling_cutoffs(dates, n_cutoffs, horizon_days, initial_days=None):
+    if initial_days is None:
+        initial_days = 3 * horizon_days
+    dates = pd.DatetimeIndex(dates)
+    first = dates[0] + pd.Timedelta(days=initial_days)
+    last = dates[-1] - pd.Timedelta(days=horizon_days)
+    if last < first:
+        return pd.DatetimeIndex([])
+
+    # Whole weeks between cutoffs, counted from the epoch so the grid is the same every day
+    span = (last - first).days
+    period = max(7, span // max(n_cutoffs - 1, 1) // 7 * 7)
+    latest = (last - pd.Timestamp(0)).days // period * period
+    grid = pd.Timestamp(0) + pd.to_timedelta(latest - period * np.arange(n_cutoffs), unit='D')
+    grid = grid[grid >= first]
+
+    # Cut at the last trading day on or before each grid date
+    positions = np.unique(dates.searchsorted(grid, side='right') - 1)
+    return dates[positions[positions >= 0]]
+
+
+# Function to fit one cutoff's training window and forecast its horizon
+def cutoff_forecast(ticker, history, cutoff, horizon_days, params):
+    train = history[history['ds'] <= cutoff]
+    test = history[(history['ds'] > cutoff) & (history['ds'] <= cutoff + pd.Timedelta(days=horizon_days))]
+    # Cutoffs run side by side in the pool, so a warm start would depend on which fit finished first
+    model = fit_prophet(ticker, train, warm_start=False, **params)
+    forecast = model.predict(test[['ds']])
+    return pd.DataFrame({
+        'ds': test['ds'].values,
+        'cutoff': cutoff,
+        'y': test['y'].values,
+        'yhat': forecast['yhat'].values,
+        'yhat_lower': forecast['yhat_lower'].values,
+        'yhat_upper': forecast['yhat_upper'].values,
+    })
+
+
+# Function to forecast every cutoff, in the process pool with up to max_workers fits at a time
+# (by default one per CPU)
+def cross_validate(ticker, history, cutoffs, horizon_days, params=None, max_workers=None):
+    params = params or {}
+    history = history.reset_index(drop=True)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers <= 1 or len(cutoffs) <= 1:
+        results = [cutoff_forecast(ticker, history, cutoff, horizon_days, params) for cutoff in cutoffs]
+    else:
+        calls = {cutoff: (cutoff_forecast, ticker, history, cutoff, horizon_days, params) for cutoff in cutoffs}
+        results = [result for _, result in run_limited(POOL_NAME, calls, max_workers)]
+    if not results:
+        return pd.DataFrame(columns=['ds', 'cutoff', 'y', 'yhat', 'yhat_lower', 'yhat_upper'])
+    return pd.concat(results, ignore_index=True).sort_values(['cutoff', 'ds']).reset_index(drop=True)
+
+
+# Function to summarise cross-validation errors by horizon, in bins of bin_days days
+def horizon_metrics(results, bin_days=HORIZON_BIN_DAYS):
+    horizon = (results['ds'] - results['cutoff']).dt.days
+    errors = results['yhat'] - results['y']
+    frame = pd.DataFrame({
+        'Horizon (days)': np.minimum((horizon - 1) // bin_days * bin_days + bin_days, horizon.max()),
+        'ape': errors.abs() / results['y'].abs(),
+        'se': errors ** 2,
+        'covered': (results['y'] >= results['yhat_lower']) & (results['y'] <= results['yhat_upper']),
+    })
+    metrics = frame.groupby('Horizon (days)').agg(MAPE=('ape', 'mean'), MSE=('se', 'mean'),
+                                                  Coverage=('covered', 'mean'), Points=('ape', 'size'))
+    metrics.insert(1, 'RMSE', np.sqrt(metrics.pop('MSE')))
+    return metrics.reset_index()
@@ -0,0 +1,46 @@
+# Concurrent Prophet fits and forecasts in a process pool.
+#
+# Each job fits (or loads from the model cache) one Prophet model and predicts its horizon
+# in a worker process, so independent models spend their time in Stan side by side.
+# Results are yielded as soon as each job finishes. The pool is kept alive between page
+# reruns so the workers import Prophet and Stan only once.
+
+import os
+
+from prophet.serialize import model_from_json, model_to_json
+
+from utils.process_pool import run_limited
+from utils.prophet_cache import fit_prophet
+
+# Name of the shared pool the fits run in
+POOL_NAME = 'prophet'
+
+
+# Function to fit a model for a ds/y training window and forecast the given number of days past it
+def fit_and_forecast(ticker, history, periods, params):
+    model = fit_prophet(ticker, history, **params)
+    forecast = model.predict(model.make_future_dataframe(periods=periods))
+    return model, forecast
+
+
+# Function to run one job in a worker; the model travels back in Prophet's JSON format
+def _forecast_job(ticker, history, periods, params):
+    model, forecast = fit_and_forecast(ticker, history, periods, params)
+    return model_to_json(model), forecast
+
+
+# Function to fit and forecast several Prophet models concurrently. jobs maps a name to
+# (history, periods); yields (name, model, forecast) in the order the jobs finish. On a
+# single CPU the jobs simply run one after another in order.
+def forecast_concurrently(ticker, jobs, params=None, max_workers=None):
+    params = params or {}
+    if max_workers is None:
+        max_workers = min(len(jobs), os.cpu_count() or 1)
+    if max_workers <= 1:
+        for name, (history, periods) in jobs.items():
+            yield (name,) + fit_and_forecast(ticker, history, periods, params)
+        return
+
+    calls = {name: (_forecast_job, ticker, history, periods, params) for name, (history, periods) in jobs.items()}
+    for name, (model_json, forecast) in run_limited(POOL_NAME, calls, max_workers):
+        yield name, model_from_json(model_json), forecast
@@ -0,0 +1,66 @@
+# Batch VADER scoring of large headline corpora in a process pool.
+#
+# VADER scores one headline at a time in pure Python, so a back-filled corpus is split into
+# chunks that are scored side by side in worker processes. Each worker loads the analyzer and
+# its lexicon once when it starts, and sends back a plain float array per chunk instead of a
+# list of dicts. Repeated headlines are scored only once. Small batches, and machines with a
+# single CPU, are scored in the calling process.
+
+import os
+
+import numpy as np
+import pandas as pd
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+from utils.process_pool import run_limited
+
+SCORE_COLUMNS = ['neg', 'neu', 'pos', 'compound']
+
+# Headlines per chunk sent to a worker, and the batch size below which a pool is not worth it
+CHUNK_SIZE = 2000
+MIN_PARALLEL = 5000
+
+# Analyzer of this process, built on first use
+_vader = None
+
+# Name of the shared pool the chunks are scored in
+POOL_NAME = 'vader'
+
+
+# Function to get the analyzer of this process, loading the lexicon once
+def get_analyzer():
+    global _vader
+    if _vader is None:
+        _vader = SentimentIntensityAnalyzer()
+    return _vader
+
+
+# Function to score a sequence of headlines into an array with one column per VADER score
+def score_chunk(headlines):
+    vader = get_analyzer()
+    scores = np.empty((len(headlines), len(SCORE_COLUMNS)))
+    for row, headline in enumerate(headlines):
+        polarity = vader.polarity_scores(headline)
+        scores[row] = [polarity[column] for column in SCORE_COLUMNS]
+    return scores
+
+
+# Function to score many headlines, returning {score name: float array} in the order given.
+# Up to max_workers chunks (by default one per CPU) are scored at a time; each worker builds
+# its analyzer as it starts, so no chunk pays for loading the lexicon.
+def score_headlines(headlines, chunk_size=CHUNK_SIZE, max_workers=None):
+    # Score every distinct headline once and spread the scores back over the repeats
+    codes, unique = pd.factorize(pd.Series(headlines, dtype=object))
+    unique = list(unique)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if max_workers <= 1 or len(unique) < max(MIN_PARALLEL, 2 * chunk_size):
+        scores = score_chunk(unique)
+    else:
+        calls = {start: (score_chunk, unique[start:start + chunk_size]) for start in range(0, len(unique), chunk_size)}
+        chunks = dict(run_limited(POOL_NAME, calls, max_workers, initializer=get_analyzer))
+        scores = np.concatenate([chunks[start] for start in calls])
+
+    scores = scores.reshape(-1, len(SCORE_COLUMNS))[codes]
+    return {column: scores[:, index] for index, column in enumerate(SCORE_COLUMNS)}
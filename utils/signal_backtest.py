@@ -0,0 +1,133 @@
+# Vectorized backtest of the Buy/Sell signal rules on the Signals page.
+#
+# Signals decided on a bar's close set the position held over the next bar. Positions,
+# the equity curve, drawdown, trades and hit rate are all array operations along the time
+# axis, and any trailing axes are independent parameter combinations, so a whole grid of
+# RSI thresholds, Bollinger multipliers and SR zone counts is evaluated in one call.
+
+from math import sqrt
+
+import numpy as np
+import pandas as pd
+
+from utils.indicators import indicator_frame
+from utils.sr_zones import optimal_centers, zone_membership
+
+
+# Function to hold a position from each entry until the opposite signal; shorts only when allowed
+def signal_positions(buy, sell, allow_short=False):
+    row = np.arange(buy.shape[0]).reshape((-1,) + (1,) * (buy.ndim - 1))
+    last_buy = np.maximum.accumulate(np.where(buy, row, -1), axis=0)
+    last_sell = np.maximum.accumulate(np.where(sell, row, -1), axis=0)
+    position = (last_buy > last_sell).astype(float)
+    if allow_short:
+        position -= last_sell > last_buy
+    return position
+
+
+# Function to compute strategy returns, equity curve and statistics for positions on a close series.
+# position[t] is decided on bar t and earns the return from bar t to bar t + 1.
+def signal_performance(close, position, periods_per_year=252):
+    close = np.asarray(close, dtype=float).reshape((-1,) + (1,) * (position.ndim - 1))
+    held = position[:-1]
+    returns = held * (close[1:] / close[:-1] - 1)
+    growth = np.cumsum(np.log1p(returns), axis=0)
+    equity = np.exp(growth)
+
+    # Drawdown against the running peak, counting the starting equity of 1 as a peak
+    peak = np.maximum(np.maximum.accumulate(growth, axis=0), 0)
+    max_drawdown = np.expm1(growth - peak).min(axis=0)
+
+    # A trade is a run of the same non-zero position; open trades are marked to the last bar
+    previous = np.concatenate([np.zeros((1,) + held.shape[1:]), held[:-1]])
+    following = np.concatenate([held[1:], np.zeros((1,) + held.shape[1:])])
+    starts = (held != 0) & (held != previous)
+    ends = (held != 0) & (held != following)
+    row = np.arange(held.shape[0]).reshape((-1,) + (1,) * (held.ndim - 1))
+    start_row = np.maximum.accumulate(np.where(starts, row, 0), axis=0)
+    before_start = np.concatenate([np.zeros((1,) + held.shape[1:]), growth[:-1]])
+    trade_growth = growth - np.take_along_axis(before_start, start_row, axis=0)
+    num_trades = ends.sum(axis=0)
+    wins = (ends & (trade_growth > 0)).sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = returns.mean(axis=0) / returns.std(axis=0, ddof=1) * sqrt(periods_per_year)
+        hit_rate = wins / num_trades
+    return {
+        'returns': returns,
+        'equity': equity,
+        'total_return': equity[-1] - 1 if len(equity) else np.zeros(held.shape[1:]),
+        'sharpe': sharpe,
+        'max_drawdown': max_drawdown,
+        'hit_rate': hit_rate,
+        'num_trades': num_trades,
+        'exposure': (held != 0).mean(axis=0),
+    }
+
+
+# Function to backtest the Buy_Signal/Sell_Signal columns of a signal frame
+def backtest_signals(data, allow_short=False, confirm_zones=False):
+    buy = data['Buy_Signal'].to_numpy()
+    sell = data['Sell_Signal'].to_numpy()
+    if confirm_zones:
+        # Only act on signals inside an SR zone, i.e. where Take_Action_Signal also fires
+        buy = buy & data['Take_Action_Signal'].to_numpy()
+        sell = sell & data['Take_Action_Signal'].to_numpy()
+    return signal_performance(data['Close'], signal_positions(buy, sell, allow_short))
+
+
+# Function to backtest the signal rules over a grid of RSI thresholds, Bollinger multipliers and
+# SR zone counts. Results have shape [clusters, multipliers, RSI buy levels, RSI sell levels].
+# Like find_sr_zones, zones are built from every close, or from all but the last if forming_bar.
+def sweep_signals(close, rsi_buy_levels, rsi_sell_levels, band_multipliers, cluster_counts, zone_width_pct=5.0,
+                  allow_short=False, confirm_zones=False, forming_bar=False, max_elements=4_000_000):
+    close = np.asarray(close, dtype=float)
+    rsi_buy_levels = np.asarray(rsi_buy_levels, dtype=float)
+    rsi_sell_levels = np.asarray(rsi_sell_levels, dtype=float)
+    band_multipliers = np.asarray(band_multipliers, dtype=float)
+
+    # Indicators are computed once; a band multiplier only scales the rolling std around the mean
+    indicators, _ = indicator_frame(close)
+    rsi = indicators['RSI'].to_numpy()[:, None, None, None]
+    ma = indicators['MA20'].to_numpy()[:, None, None, None]
+    std = pd.Series(close).rolling(window=20).std().to_numpy()[:, None, None, None]
+    prices = close[:, None, None, None]
+    multipliers = band_multipliers[:, None, None]
+    with np.errstate(invalid='ignore'):
+        oversold = rsi < rsi_buy_levels[:, None]
+        overbought = rsi > rsi_sell_levels[None, :]
+    completed = close[:-1] if forming_bar else close
+    sorted_closes = np.sort(completed[~np.isnan(completed)])
+
+    shape = (len(cluster_counts), len(band_multipliers), len(rsi_buy_levels), len(rsi_sell_levels))
+    results = {name: np.empty(shape) for name in ('total_return', 'sharpe', 'max_drawdown', 'hit_rate', 'exposure')}
+    results['num_trades'] = np.empty(shape, dtype=int)
+
+    # Evaluate as many multipliers at a time as fit in the element budget
+    chunk = max(1, max_elements // (len(close) * len(rsi_buy_levels) * len(rsi_sell_levels)))
+    for c, num_clusters in enumerate(cluster_counts):
+        # Without zone confirmation the cluster count does not change the signals
+        if not confirm_zones and c:
+            for name in results:
+                results[name][c] = results[name][0]
+            continue
+        in_zone = True
+        if confirm_zones:
+            centers = optimal_centers(sorted_closes, num_clusters, zone_width_pct / 10)
+            in_zone = zone_membership(close, centers, zone_width_pct).any(axis=-1)[:, None, None, None]
+        for start in range(0, len(band_multipliers), chunk):
+            multiplier = multipliers[start:start + chunk]
+            with np.errstate(invalid='ignore'):
+                buy = oversold & (prices < ma - multiplier * std) & in_zone
+                sell = overbought & (prices > ma + multiplier * std) & in_zone
+            stats = signal_performance(close, signal_positions(buy, sell, allow_short))
+            for name in results:
+                results[name][c, start:start + chunk] = stats[name]
+
+    results.update({
+        'cluster_counts': list(cluster_counts),
+        'band_multipliers': band_multipliers,
+        'rsi_buy_levels': rsi_buy_levels,
+        'rsi_sell_levels': rsi_sell_levels,
+    })
+    return results
@@ -0,0 +1,97 @@
+# Vectorized technical indicators and trading signals over a (dates x tickers) close panel.
+#
+# Every indicator is computed for all columns at once, so a whole watchlist is screened
+# with a handful of array operations instead of one page rerun per ticker. A single
+# ticker is just a one-column panel, and the results match the per-ticker code.
+
+import numpy as np
+import pandas as pd
+
+from utils.sr_zones import optimal_centers_many, zone_membership
+
+
+# Function to compute Wilder's RSI for every column, matching ta.momentum.RSIIndicator
+def rsi(close, window=14):
+    diff = close.diff(1)
+    # Rows before a ticker's first close stay missing so each column starts on its own first bar
+    up = diff.where(diff > 0, 0.0).where(close.notna())
+    down = -diff.where(diff < 0, 0.0).where(close.notna())
+    ema_up = up.ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    ema_down = down.ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (100 - 100 / (1 + ema_up / ema_down)).mask(ema_down == 0, 100)
+
+
+# Function to compute the moving average and Bollinger Bands for every column
+def bollinger_bands(close, window=20, num_std=2):
+    rolling = close.rolling(window=window)
+    ma = rolling.mean()
+    std = rolling.std()
+    return ma, ma + num_std * std, ma - num_std * std
+
+
+# Function to find the optimal 1-D clustering of each column's closes as SR zone prices, all
+# columns in one batched solve over price bins of bin_pct percent. Columns with fewer bins
+# than zones are padded with NaN.
+def sr_zone_centers(close, num_clusters, bin_pct=0.5):
+    values = np.sort(np.asarray(close, dtype=float), axis=0)
+    counts = np.sum(~np.isnan(values), axis=0)
+    columns = [values[:count, column] for column, count in enumerate(counts)]
+    return optimal_centers_many(columns, num_clusters, bin_pct)
+
+
+# Function to flag the rows whose close lies within zone_width_pct percent of any SR zone of its column
+def in_sr_zones(close, centers, zone_width_pct):
+    inside = zone_membership(close, centers[None], zone_width_pct)
+    return pd.DataFrame(inside.any(axis=-1), index=close.index, columns=close.columns)
+
+
+# Function to compute all indicators and Buy/Sell/Take-Action signals for a close panel
+def signal_panel(close, num_clusters=5, zone_width_pct=5.0):
+    panel_rsi = rsi(close)
+    ma, upper, lower = bollinger_bands(close)
+    # Bins a tenth of the zone width keep the zones well within the width of their optimum
+    centers = sr_zone_centers(close, num_clusters, zone_width_pct / 10)
+    in_zone = in_sr_zones(close, centers, zone_width_pct)
+    extreme = (panel_rsi < 30) | (panel_rsi > 70) | (close < lower) | (close > upper)
+    return {
+        'RSI': panel_rsi,
+        'MA20': ma,
+        'UpperBand': upper,
+        'LowerBand': lower,
+        'SR_Zones': centers,
+        'Buy_Signal': (panel_rsi < 30) & (close < lower),
+        'Sell_Signal': (panel_rsi > 70) & (close > upper),
+        'Take_Action_Signal': in_zone & extreme,
+    }
+
+
+# Function to list the tickers whose latest bar fires a Buy, Sell or Take-Action signal
+def screen_signals(close, num_clusters=5, zone_width_pct=5.0):
+    close = close.dropna(axis=1, how='all')
+    signals = signal_panel(close, num_clusters, zone_width_pct)
+    # The latest bar of each ticker, which may be older than the panel's last row
+    last = close.notna()[::-1].idxmax()
+    rows = close.index.get_indexer(last)
+    columns = np.arange(close.shape[1])
+
+    def latest(frame):
+        return np.asarray(frame)[rows, columns]
+
+    centers = signals['SR_Zones']
+    last_close = latest(close)
+    nearest = centers[columns, np.nanargmin(np.abs(centers - last_close[:, None]), axis=1)]
+    table = pd.DataFrame({
+        'Ticker': close.columns,
+        'Date': last.values,
+        'Close': last_close,
+        'RSI': latest(signals['RSI']),
+        'LowerBand': latest(signals['LowerBand']),
+        'UpperBand': latest(signals['UpperBand']),
+        'Nearest_SR_Zone': nearest,
+        'Buy_Signal': latest(signals['Buy_Signal']),
+        'Sell_Signal': latest(signals['Sell_Signal']),
+        'Take_Action_Signal': latest(signals['Take_Action_Signal']),
+    })
+    firing = table['Buy_Signal'] | table['Sell_Signal'] | table['Take_Action_Signal']
+    return table[firing].reset_index(drop=True)
@@ -0,0 +1,166 @@
+# Deterministic support/resistance zones from optimal 1-D clustering of closes.
+#
+# On sorted data the k-means partition is a set of contiguous runs, so the optimal one is
+# found exactly by dynamic programming over prefix sums instead of random restarts. The
+# optimal split point is monotone in the run end, which lets every DP layer be solved by
+# divide and conquer in O(n log n); all sub-problems of one recursion level, across any
+# number of series, are evaluated together with array operations. The sorted closes are
+# kept as state, so appending bars is a merge rather than a new sort, and the same closes
+# always give the same zones.
+#
+# One fit is not faster than one KMeans fit: on ten years of daily closes the exact fit
+# takes about 5 ms against about 2 ms, and a fit over price bins (bin_pct) about 2 ms. The
+# time saved comes from not importing scikit-learn (about 0.8 s), from reusing the sorted
+# closes and solved zones between reruns, and from solving a whole watchlist in one batch.
+
+import numpy as np
+
+
+# Function to compute the within-run sum of squares of points j..i from prefix sums
+def _run_cost(sums, squares, weights, j, i):
+    total = sums[i + 1] - sums[j]
+    return squares[i + 1] - squares[j] - total * total / (weights[i + 1] - weights[j])
+
+
+# Function to solve one DP layer, best[i] = min over j of previous[j - 1] + cost(j, i), for every
+# problem whose run ends lie in [i_lo, i_hi] and splits in [j_lo, j_hi]. All problems share the
+# arrays, so many columns are solved by the same few array operations.
+def _solve_layer(previous, sums, squares, weights, i_lo, i_hi, j_lo, j_hi):
+    best = np.full(len(previous), np.inf)
+    split = np.zeros(len(previous), dtype=int)
+
+    while len(i_lo):
+        mid = (i_lo + i_hi) // 2
+        counts = np.minimum(mid, j_hi) - j_lo + 1
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        task = np.repeat(np.arange(len(mid)), counts)
+        j = j_lo[task] + np.arange(counts.sum()) - starts[task]
+        values = previous[j - 1] + _run_cost(sums, squares, weights, j, mid[task])
+
+        # First split reaching the minimum of each sub-problem
+        minima = np.minimum.reduceat(values, starts)
+        opt = np.minimum.reduceat(np.where(values == minima[task], j, len(previous)), starts)
+        best[mid] = minima
+        split[mid] = opt
+
+        left = mid > i_lo
+        right = mid < i_hi
+        i_lo, i_hi = np.concatenate([i_lo[left], mid[right] + 1]), np.concatenate([mid[left] - 1, i_hi[right]])
+        j_lo, j_hi = np.concatenate([j_lo[left], opt[right]]), np.concatenate([opt[left], j_hi[right]])
+    return best, split
+
+
+# Function to collapse sorted values into weighted points: runs of equal prices, or with bin_pct
+# set, log-spaced price bins of that width in percent
+def _weighted_points(sorted_values, bin_pct=None):
+    values = np.asarray(sorted_values, dtype=float)
+    if not len(values):
+        return np.empty(0), np.empty(0, dtype=int)
+    keys = values if bin_pct is None else np.floor(np.log(values) / np.log1p(bin_pct / 100))
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1])
+    counts = np.diff(np.append(starts, len(values)))
+    return np.add.reduceat(values, starts) / counts, counts
+
+
+# Function to find the 1-D k-means centres of many already sorted series at once. Returns a
+# (series x num_clusters) array, padded with NaN where a series has fewer distinct points than
+# clusters. Repeated prices become one weighted point, which leaves the optimum unchanged; with
+# bin_pct set, every price bin becomes one point, so the runs are optimal over whole bins.
+# Either way each centre is the exact mean of the closes in its run.
+def optimal_centers_many(sorted_columns, num_clusters, bin_pct=None):
+    collapsed = [_weighted_points(values, bin_pct) for values in sorted_columns]
+    points = [column for column, _ in collapsed]
+    counts = [column for _, column in collapsed]
+    sizes = np.array([len(column) for column in points], dtype=int)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    clusters = np.minimum(num_clusters, sizes)
+    centers = np.full((len(points), num_clusters), np.nan)
+    if not sizes.sum():
+        return centers
+
+    # Centre each series so the prefix sums of squares stay well conditioned
+    points = np.concatenate(points)
+    counts = np.concatenate(counts)
+    nonempty = sizes > 0
+    shift = np.zeros(len(sizes))
+    shift[nonempty] = points[offsets[:-1][nonempty] + sizes[nonempty] // 2]
+    centred = points - np.repeat(shift, sizes)
+    sums = np.concatenate([[0.], np.cumsum(counts * centred)])
+    squares = np.concatenate([[0.], np.cumsum(counts * centred * centred)])
+    weights = np.concatenate([[0], np.cumsum(counts)])
+
+    first = np.repeat(offsets[:-1], sizes)
+    best = _run_cost(sums, squares, weights, first, np.arange(len(points)))
+    splits = []
+    for layer in range(1, num_clusters):
+        active = clusters > layer
+        i_lo = offsets[:-1][active] + layer
+        i_hi = offsets[1:][active] - 1
+        best, split = _solve_layer(best, sums, squares, weights, i_lo, i_hi, i_lo.copy(), i_hi.copy())
+        splits.append(split)
+
+    # Walk the split points back from the last run to recover where every run starts;
+    # runs beyond a series' own cluster count stay empty
+    bounds = np.empty((len(sizes), num_clusters + 1), dtype=int)
+    bounds[:, 0] = offsets[:-1]
+    bounds[:, -1] = offsets[1:]
+    for layer in range(num_clusters - 1, 0, -1):
+        following = bounds[:, layer + 1]
+        bounds[:, layer] = np.where(clusters > layer, splits[layer - 1][np.maximum(following - 1, 0)], following)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        centers = np.diff(sums[bounds], axis=1) / np.diff(weights[bounds], axis=1)
+    return centers + shift[:, None]
+
+
+# Function to find the 1-D k-means centres of one already sorted series
+def optimal_centers(sorted_values, num_clusters, bin_pct=None):
+    centers = optimal_centers_many([sorted_values], num_clusters, bin_pct)[0]
+    return centers[~np.isnan(centers)]
+
+
+# Function to start a zone state from a close series and its dates
+def zone_state(closes, dates):
+    closes = np.asarray(closes, dtype=float)
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    return {
+        'sorted': np.sort(closes[~np.isnan(closes)]),
+        'n_bars': len(closes),
+        'last_date': dates[-1] if len(dates) else None,
+        'centers': {},
+    }
+
+
+# Function to bring a zone state up to date with a close series, merging only the appended bars.
+# The state is rebuilt when the series no longer extends the bars it was built from.
+def update_zone_state(state, closes, dates):
+    closes = np.asarray(closes, dtype=float)
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    if state is None or state['last_date'] is None or not len(dates):
+        return zone_state(closes, dates)
+    seen = int(np.searchsorted(dates, state['last_date'], side='right'))
+    if seen != state['n_bars'] or dates[seen - 1] != state['last_date']:
+        return zone_state(closes, dates)
+    if seen == len(closes):
+        return state
+
+    new = np.sort(closes[seen:][~np.isnan(closes[seen:])])
+    return {
+        'sorted': np.insert(state['sorted'], np.searchsorted(state['sorted'], new), new),
+        'n_bars': len(closes),
+        'last_date': dates[-1],
+        'centers': {},
+    }
+
+
+# Function to return the sorted SR zone prices of a state, solving each setting once
+def zone_centers(state, num_clusters, bin_pct=None):
+    if (num_clusters, bin_pct) not in state['centers']:
+        state['centers'][num_clusters, bin_pct] = optimal_centers(state['sorted'], num_clusters, bin_pct)
+    return state['centers'][num_clusters, bin_pct]
+
+
+# Function to flag, per zone, the closes within zone_width_pct percent of the zone price
+def zone_membership(closes, centers, zone_width_pct):
+    closes = np.asarray(closes, dtype=float)
+    width = np.abs(centers) * zone_width_pct / 100
+    return np.abs(closes[..., None] - centers) < width
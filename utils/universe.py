@@ -0,0 +1,114 @@
+# Tiled Engle-Granger scan over a large symbol universe with bounded memory.
+#
+# The symbols are cut into blocks and the upper triangle of the pair matrix is processed
+# one (block, block) tile at a time, sized so the lagged design matrices of a tile fit in a
+# memory budget. Only a running top-N heap of the pairs below the p-value threshold is
+# kept, and it is checkpointed to disk after every tile so an interrupted scan resumes
+# from the next unfinished tile.
+
+import hashlib
+import heapq
+import json
+import os
+
+import numpy as np
+
+from utils.cointegration import coint_pairs
+
+CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'universe')
+
+
+# Function to build the checkpoint key for one price panel and scan setting
+def checkpoint_key(prices, symbols, cointegration_threshold, top_n):
+    digest = hashlib.sha1(np.ascontiguousarray(prices, dtype=float).tobytes())
+    digest.update('|'.join([str(cointegration_threshold), str(top_n)] + list(symbols)).encode())
+    return digest.hexdigest()
+
+
+# Function to load a checkpoint, or None if there is none
+def load_checkpoint(key):
+    path = os.path.join(CHECKPOINT_DIR, f'{key}.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+# Function to save a checkpoint atomically so an interrupted write never corrupts it
+def save_checkpoint(key, checkpoint):
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    path = os.path.join(CHECKPOINT_DIR, f'{key}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(path + '.tmp', path)
+
+
+# Function to estimate the peak bytes coint_pairs needs per pair for a series of n_rows
+def bytes_per_pair(n_rows):
+    maxlag = min(n_rows // 2 - 1, int(np.ceil(12.0 * np.power(n_rows / 100.0, 1 / 4.0))))
+    # Hedge regression copies plus the lagged design, its differences and the fitted errors
+    return 8 * n_rows * (maxlag + 10)
+
+
+# Function to pick the symbol block size whose tiles fit in the memory budget
+def block_size(n_rows, n_symbols, memory_budget):
+    pairs = max(1, memory_budget // bytes_per_pair(n_rows))
+    return int(max(1, min(n_symbols, np.sqrt(pairs))))
+
+
+# Function to list the (first, second) block starts of the upper-triangle tiles in scan order
+def tile_starts(n_symbols, block):
+    starts = range(0, n_symbols, block)
+    return [(a, b) for a in starts for b in starts if a <= b]
+
+
+# Function to list the pairs (i < j) of one tile
+def tile_pairs(n_symbols, block, a, b):
+    left, right = np.meshgrid(np.arange(a, min(a + block, n_symbols)),
+                              np.arange(b, min(b + block, n_symbols)), indexing='ij')
+    keep = left < right
+    return left[keep], right[keep]
+
+
+# Function to push a tile's pairs below the threshold onto the running top-N heap.
+# Heap entries are (correlation, -order, left, right, pvalue) so that among equal
+# correlations the pair found first in nested-loop order is kept, as with nlargest.
+def push_top(heap, top_n, n_symbols, left, right, pvalues, correlations, cointegration_threshold):
+    for k in np.flatnonzero(pvalues < cointegration_threshold):
+        item = (float(correlations[k]), -int(left[k] * n_symbols + right[k]),
+                int(left[k]), int(right[k]), float(pvalues[k]))
+        if len(heap) < top_n:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+
+# Function to scan every pair of a universe tile by tile, yielding (tiles done, total tiles, heap)
+# after each tile. The heap holds (correlation, -order, left, right, pvalue) entries.
+def scan_universe(prices, symbols, cointegration_threshold=0.05, top_n=10, memory_budget=256 * 2 ** 20):
+    prices = np.asarray(prices, dtype=float)
+    n_rows, n_symbols = prices.shape
+    key = checkpoint_key(prices, symbols, cointegration_threshold, top_n)
+
+    # Resume with the block size the checkpoint was written with, so tile numbers still line up
+    checkpoint = load_checkpoint(key)
+    if checkpoint is None:
+        checkpoint = {'block': block_size(n_rows, n_symbols, memory_budget), 'next_tile': 0, 'heap': []}
+    block = checkpoint['block']
+    heap = [tuple(item) for item in checkpoint['heap']]
+    heapq.heapify(heap)
+    tiles = tile_starts(n_symbols, block)
+    chunk_size = max(1, memory_budget // bytes_per_pair(n_rows))
+
+    yield checkpoint['next_tile'], len(tiles), heap
+    for t in range(checkpoint['next_tile'], len(tiles)):
+        a, b = tiles[t]
+        left, right = tile_pairs(n_symbols, block, a, b)
+        if len(left):
+            # Test on the tile's columns only, then map back to universe indices
+            columns = np.unique(np.concatenate([left, right]))
+            _, pvalues, correlations = coint_pairs(prices[:, columns], np.searchsorted(columns, left),
+                                                   np.searchsorted(columns, right), chunk_size=chunk_size)
+            push_top(heap, top_n, n_symbols, left, right, pvalues, correlations, cointegration_threshold)
+        save_checkpoint(key, {'block': block, 'next_tile': t + 1, 'heap': heap})
+        yield t + 1, len(tiles), heap